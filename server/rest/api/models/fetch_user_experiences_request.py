@@ -0,0 +1,6 @@
+from pydantic import BaseModel
+from typing import List
+
+
+class FetchUserExperiencesRequest(BaseModel):
+    usernames: List[str]
\ No newline at end of file
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException
+from typing import Optional
+from api.utils.analytics import normalize_label
+from db.analytics import load_result
+
+router = APIRouter()
+
+@router.get("/erowid/analytics")
+async def get_analytics(substance: Optional[str] = None, route: Optional[str] = None, unit: Optional[str] = None):
+    """
+    Precomputed dose and demographics analytics over the stored reports.
+    Args:
+        substance: Substance as named in dose charts (case-insensitive). Without it, the corpus overview is returned.
+        route: Only dose distributions for this route, e.g. oral (requires substance)
+        unit: Only dose distributions in this unit: mg, mL or a count unit such as tab (requires substance)
+    """
+    result = await load_result(normalize_label(substance) if substance else "")
+    if result is None:
+        if not substance:
+            raise HTTPException(status_code=404, detail="Analytics have not been built yet")
+        raise HTTPException(status_code=404, detail=f"No analytics for substance '{substance}'")
+
+    if substance and (route or unit):
+        result["doses"] = [
+            dose for dose in result["doses"]
+            if (not route or dose["route"] == normalize_label(route))
+            and (not unit or dose["unit"].lower() == unit.lower())
+        ]
+
+    return {"status": "success", "data": result}
@@ -1,29 +1,47 @@
 import httpx
 from fastapi import APIRouter, HTTPException
-from bs4 import BeautifulSoup, NavigableString, Tag
 from api.models.fetch_experience_request import FetchExperienceRequest
 from api.models.fetch_experience_details_request import FetchExperienceDetailsRequest
 from api.models.fetch_category_experiences_request import FetchCategoryExperiencesRequest
 from api.models.fetch_random_experiences_request import FetchRandomExperiencesRequest
-from api.utils.utils import check_experience_exists, fetch_experience_categories, fetch_paginated_experiences, logger
+from api.models.fetch_user_experiences_request import FetchUserExperiencesRequest
+from api.utils.utils import fetch_paginated_experiences, is_erowid_experiences_url, parse_fields, search_author_experiences, logger
+from api.utils.extractors import LISTING_FIELDS, REPORT_FIELDS, extract_report
+from api.utils.hedging import hedged_get
+from api.utils.similarity import most_similar
+from db.author_index import author_pages, experience_id, index_listing, mark_searched, paginate
+from db.report_store import content_range, content_summary, load_report, save_report
+from db.similarity import current_index
+from db.substance_graph import resolve_categories, resolve_experiences, resolve_many_experiences
 from fastapi.responses import JSONResponse
 import random
 import asyncio
-from typing import List
-import re
+from typing import List, Optional
 
 router = APIRouter()
 
+MAX_USER_PAGE_SIZE = 500
+MAX_BATCH_USERNAMES = 50
+MAX_SIMILAR = 50
+# Live AuthorSearches run at once per worker, however many a batch asks for
+MAX_CONCURRENT_AUTHOR_SEARCHES = 4
+
+_author_searches = asyncio.Semaphore(MAX_CONCURRENT_AUTHOR_SEARCHES)
+
+
+def _page_size(size: int) -> int:
+    return min(max(size, 1), MAX_USER_PAGE_SIZE)
+
 @router.post("/erowid/experiences/categories")
 async def fetch_substance_categories(request: FetchExperienceRequest):
     """
     Fetch categories for a given substance URL.
     Returns success status, whether experiences exist, and their categories.
     """
-    has_experiences, more_url = await check_experience_exists(request.url)
+    has_experiences, more_url = await resolve_experiences(request.url)
     
     if has_experiences and more_url:
-        categories = await fetch_experience_categories(more_url)
+        categories = await resolve_categories(more_url)
         return {
             "status": "success",
             "has_experiences": True,
@@ -39,110 +57,99 @@ async def fetch_substance_categories(request: FetchExperienceRequest):
     }
 
 @router.post("/erowid/category/experiences")
-async def fetch_category_experiences(request: FetchCategoryExperiencesRequest, start: int = 0, max: int = 100):
+async def fetch_category_experiences(request: FetchCategoryExperiencesRequest, start: int = 0, max: int = 100,
+                                     fields: Optional[str] = None):
     """
     Fetch experiences from a category page and handle pagination.
     Args:
         request: Contains the base URL for the category
         start: Starting index for pagination (default: 0)
         max: Maximum number of results per page (default: 100)
+        fields: Comma-separated row fields to return (default: all)
     """
-    result = await fetch_paginated_experiences(request.url, start, max)
+    selected = parse_fields(fields, LISTING_FIELDS)
+    result = await fetch_paginated_experiences(request.url, start, max, selected)
+    # Rows of a listing from any other host would overwrite real ExpIDs
+    if selected is None and is_erowid_experiences_url(request.url):
+        await index_listing(result["experiences"])
     return {
         "status": "success",
         **result
     }
     
 @router.post("/erowid/experience")
-async def fetch_experience_details(request: FetchExperienceDetailsRequest):
+async def fetch_experience_details(request: FetchExperienceDetailsRequest, fields: Optional[str] = None,
+                                   offset: Optional[int] = None, limit: Optional[int] = None,
+                                   summary: bool = False):
     """
     Fetch details of a specific Erowid experience.
     Normalises content by converting <br>, <p>, and other tags to clean new‑line text.
+    `fields` (comma-separated) limits the response, and the parsing, to those fields.
+    `offset`/`limit` return only that range of content paragraphs; `summary` drops the
+    content for an excerpt and its size. Both are served from the local report store.
     """
-    async with httpx.AsyncClient(verify=False, timeout=30.0) as client:
-        response = await client.get(request.url)
-        response.encoding = 'cp1252'
-        if response.status_code != 200:
-            raise HTTPException(status_code=404, detail="Experience not found")
-
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        title = (soup.find("div", class_="title") or Tag()).get_text(strip=True) or None
-        author = (
-            soup.find("div", class_="author").find("a").get_text(strip=True)
-            if soup.find("div", class_="author") and soup.find("div", class_="author").find("a")
-            else None
-        )
-        substances = (
-            soup.find("div", class_="substance").get_text(strip=True)
-            if soup.find("div", class_="substance")
-            else None
-        )
-
-        doses = []
-        dosechart = soup.find("table", class_="dosechart")
-        if dosechart:
-            for row in dosechart.find_all("tr"):
-                amount_cell = row.find("td", class_="dosechart-amount")
-                method_cell = row.find("td", class_="dosechart-method")
-                substance_cell = row.find("td", class_="dosechart-substance")
-                form_cell = row.find("td", class_="dosechart-form")
-
-                dose = {
-                    "amount": amount_cell.get_text(strip=True) if amount_cell else None,
-                    "method": method_cell.get_text(strip=True) if method_cell else None,
-                    "substance": substance_cell.get_text(strip=True) if substance_cell else None,
-                    "form": form_cell.get_text(strip=True) if form_cell else None,
-                }
-
-                if any(dose.values()):
-                    doses.append(dose)
-        metadata = {}
-        footdata = soup.find("table", class_="footdata")
-        if footdata:
-            for cell in footdata.find_all("td"):
-                txt = cell.get_text(strip=True)
-                if txt.startswith("Gender:"):
-                    metadata["gender"] = txt.replace("Gender:", "").strip()
-                elif txt.startswith("Age"):
-                    metadata["age"] = txt.replace("Age at time of experience:", "").strip()
-                elif txt.startswith("Published:"):
-                    metadata["published"] = txt.replace("Published:", "").strip()
-                elif txt.startswith("Views:"):
-                    metadata["views"] = txt.replace("Views:", "").strip()
-                elif txt.startswith("ExpID:"):
-                    metadata["exp_id"] = txt.replace("ExpID:", "").strip()
-                elif "topic-list" in cell.get("class", []):
-                    metadata["topics"] = txt
-
-        content_div = soup.find("div", class_="report-text-surround")
-        cleaned_text = None
+    selected = parse_fields(fields, REPORT_FIELDS)
+    ranged = summary or offset is not None or limit is not None
 
-        if content_div:
-            for tbl in content_div.find_all("table"):
-                tbl.decompose()
-
-            for br in content_div.find_all("br"):
-                br.replace_with("\n")
+    report = await load_report(request.url)
+    if report is None:
+        async with httpx.AsyncClient(verify=False, timeout=30.0) as client:
+            response = await hedged_get(client, request.url, "report")
+            response.encoding = 'cp1252'
+            # Only a real 404 may be negatively cached; other failures stay 5xx
+            # so the response cache can fall back to a stale copy
+            if response.status_code == 404:
+                raise HTTPException(status_code=404, detail="Experience not found")
+            if response.status_code != 200:
+                raise HTTPException(status_code=502, detail=f"Erowid returned {response.status_code}")
 
-            raw_text = content_div.get_text(separator="\n", strip=True)
+            if selected is None or ranged:
+                report = await save_report(request.url, extract_report(response.text))
+            else:
+                report = extract_report(response.text, selected)
 
-            cleaned_text = re.sub(r"\n{2,}", "\n\n", raw_text)
+    if summary:
+        report = content_summary(report)
+    elif ranged:
+        report = content_range(report, offset or 0, limit)
+    report.pop("paragraph_offsets", None)
+    if selected is not None:
+        report = {k: v for k, v in report.items() if k in selected or k in ("excerpt", "paragraphs")}
 
-        return JSONResponse(
-                content={
-                    "status": "success",
-                    "data": {
-                        "url": request.url,
-                        "title": title,
-                        "author": author,
-                        "substance": substances,
-                        "doses": doses,
-                        "content": cleaned_text,
-                        "metadata": metadata,
-                    },
+    return JSONResponse(
+            content={
+                "status": "success",
+                "data": {
+                    **report,
+                    "url": request.url,
+                },
         },
     )
+@router.get("/erowid/experience/similar")
+async def fetch_similar_experiences(url: str, k: int = 10):
+    """
+    "More like this": the `k` stored reports whose text is most similar to the
+    report at `url`, by cosine similarity of precomputed TF-IDF vectors.
+    Served entirely from the local similarity index, never from Erowid.
+    """
+    index = await current_index()
+    if index is None:
+        raise HTTPException(status_code=404, detail="Similarity index has not been built yet")
+    exp_id = experience_id(url)
+    row = index.row(exp_id) if exp_id is not None else None
+    if row is None:
+        raise HTTPException(status_code=404, detail="Experience is not in the similarity index yet")
+
+    neighbours = most_similar(index, row, max(1, min(k, MAX_SIMILAR)))
+    return {
+        "status": "success",
+        "url": url,
+        "experiences": [
+            {**index.meta[r], "exp_id": int(index.exp_ids[r]), "score": round(score, 4)}
+            for r, score in neighbours
+        ],
+    }
+
 @router.post("/erowid/random/experiences")
 async def fetch_random_experiences(request: FetchRandomExperiencesRequest, size_per_substance: int = 1):
     """
@@ -157,15 +164,19 @@ async def fetch_random_experiences(request: FetchRandomExperiencesRequest, size_
         substance_urls = random.sample(substance_urls, 4)
     logger.info(f"Selected random substances: {substance_urls}")
     
+    resolved = await resolve_many_experiences(substance_urls)
+
     async def process_substance(url: str) -> List[dict]:
         logger.info(f"Processing substance URL: {url}")
         try:
-            has_experiences, experiences_url = await check_experience_exists(url)
+            if isinstance(resolved[url], Exception):
+                raise resolved[url]
+            has_experiences, experiences_url = resolved[url]
             if not has_experiences or not experiences_url:
                 logger.warning(f"No experiences found for substance: {url}")
                 return []
                 
-            categories = await fetch_experience_categories(experiences_url)
+            categories = await resolve_categories(experiences_url)
             if not categories:
                 logger.warning(f"No categories found for substance: {url}")
                 return []
@@ -192,6 +203,7 @@ async def fetch_random_experiences(request: FetchRandomExperiencesRequest, size_
             )
             
             result = experiences.get("experiences", [])
+            await index_listing(result)
             logger.info(f"Retrieved {len(result)} experiences for {url}")
             return result
             
@@ -220,63 +232,59 @@ async def fetch_random_experiences(request: FetchRandomExperiencesRequest, size_
         "feed": experiences_feed
     }
 
+async def _search_author(username: str) -> List[dict]:
+    """Live AuthorSearch fallback; results are indexed newest first."""
+    async with _author_searches:
+        rows = await search_author_experiences(username)
+    rows.sort(key=lambda row: experience_id(row["url"]) or 0, reverse=True)
+    await index_listing(rows)
+    await mark_searched(username)
+    return rows
+
+
 @router.get("/erowid/user/{username}")
-async def fetch_user_experiences(username: str):
+async def fetch_user_experiences(username: str, start: int = 0, max: int = 100):
     """
-    Fetch all experiences for a given Erowid username.
+    Fetch experiences for a given Erowid username, paginated.
+    Served from the local author index once the author has been searched live;
+    otherwise falls back to a live search.
     """
-    url = f"https://www.erowid.org/experiences/exp.cgi?A=Search&AuthorSearch={username}&Exact=1"
-    logger.info(f"Fetching user experiences for username: {username} from {url}")
-
-    try:
-        async with httpx.AsyncClient(verify=False, timeout=30.0) as client:
-            response = await client.get(url)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            exp_table = soup.find('table', class_='exp-list-table')
-            if not exp_table:
-                logger.warning(f"No experience table found for user: {username}")
-                return {"success": True, "experiences": []}
-
-            experiences = []
-            exp_rows = exp_table.find_all('tr', class_='exp-list-row')
-            for row in exp_rows:
-                try:
-                    title_cell = row.find('td', class_='exp-title')
-                    if not title_cell or not title_cell.find('a'):
-                        continue
-                    title = title_cell.find('a').text
-                    exp_url = f"https://erowid.org{title_cell.find('a')['href']}"
-
-                    author_cell = row.find('td', class_='exp-author')
-                    author = author_cell.text.strip() if author_cell else None
-
-                    substance_cell = row.find('td', class_='exp-substance')
-                    substance = substance_cell.text.strip() if substance_cell else None
+    max = _page_size(max)
+    page = (await author_pages([username], start, max))[username]
+    if page is None:
+        rows = await _search_author(username)
+        page = {"experiences": rows[start : start + max], "pagination": paginate(len(rows), start, max)}
+    return {
+        "success": True,
+        **page
+    }
 
-                    date_cell = row.find('td', class_='exp-pubdate')
-                    date = date_cell.text.strip() if date_cell else None
+@router.post("/erowid/users/experiences")
+async def fetch_users_experiences(request: FetchUserExperiencesRequest, start: int = 0, max: int = 100):
+    """
+    Batch lookup of experiences for several Erowid usernames.
+    Searched authors are resolved in one pipelined index read; the rest are searched
+    live, MAX_CONCURRENT_AUTHOR_SEARCHES at a time.
+    """
+    usernames = list(dict.fromkeys(request.usernames))
+    if len(usernames) > MAX_BATCH_USERNAMES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_USERNAMES} usernames per request")
+    max = _page_size(max)
 
-                    experiences.append({
-                        "title": title,
-                        "url": exp_url,
-                        "author": author,
-                        "substance": substance,
-                        "date": date
-                    })
-                except Exception as e:
-                    logger.error(f"Error parsing row for user {username}: {str(e)}")
-                    continue
+    pages = await author_pages(usernames, start, max)
+    unknown = [u for u, page in pages.items() if page is None]
+    searches = await asyncio.gather(*(_search_author(u) for u in unknown), return_exceptions=True)
+    for username, rows in zip(unknown, searches):
+        if isinstance(rows, Exception):
+            logger.error(f"Failed to search experiences for user {username}: {str(rows)}")
+            pages[username] = None
+        else:
+            pages[username] = {"experiences": rows[start : start + max], "pagination": paginate(len(rows), start, max)}
 
-            logger.info(f"Found {len(experiences)} experiences for user: {username}")
-            return {
-                "success": True,
-                "experiences": experiences
-            }
-    except Exception as e:
-        logger.error(f"Error fetching experiences for user {username}: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Failed to fetch user experiences: {str(e)}")
+    return {
+        "success": True,
+        "users": pages
+    }
 
 @router.post("/erowid/random/experience")
 async def fetch_random_experience(request: FetchRandomExperiencesRequest, size_per_substance: int = 1):
@@ -292,15 +300,19 @@ async def fetch_random_experience(request: FetchRandomExperiencesRequest, size_p
         substance_urls = random.sample(substance_urls, 1)
     logger.info(f"Selected random substances: {substance_urls}")
     
+    resolved = await resolve_many_experiences(substance_urls)
+
     async def process_substance(url: str) -> List[dict]:
         logger.info(f"Processing substance URL: {url}")
         try:
-            has_experiences, experiences_url = await check_experience_exists(url)
+            if isinstance(resolved[url], Exception):
+                raise resolved[url]
+            has_experiences, experiences_url = resolved[url]
             if not has_experiences or not experiences_url:
                 logger.warning(f"No experiences found for substance: {url}")
                 return []
                 
-            categories = await fetch_experience_categories(experiences_url)
+            categories = await resolve_categories(experiences_url)
             if not categories:
                 logger.warning(f"No categories found for substance: {url}")
                 return []
@@ -327,6 +339,7 @@ async def fetch_random_experience(request: FetchRandomExperiencesRequest, size_p
             )
             
             result = experiences.get("experiences", [])
+            await index_listing(result)
             logger.info(f"Retrieved {len(result)} experiences for {url}")
             return result
             
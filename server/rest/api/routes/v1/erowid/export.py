@@ -0,0 +1,34 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from api.utils.export import export_jsonl, validate
+
+router = APIRouter()
+
+MEDIA_TYPES = {
+    "gzip": ("application/gzip", ".jsonl.gz"),
+    "zstd": ("application/zstd", ".jsonl.zst"),
+    "none": ("application/x-ndjson", ".jsonl"),
+}
+
+@router.get("/erowid/export/{dataset}")
+async def export_dataset(dataset: str, compression: str = "gzip", since_id: Optional[int] = None,
+                         since: Optional[float] = None):
+    """
+    Stream a locally stored dataset (substances, listings or reports) as JSON lines.
+    Args:
+        compression: gzip (default), zstd or none
+        since_id: Only records with a higher ExpID (listings, reports)
+        since: Only reports stored after this unix timestamp
+    """
+    try:
+        validate(dataset, compression)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    media_type, extension = MEDIA_TYPES[compression]
+    return StreamingResponse(
+        export_jsonl(dataset, compression, since_id, since),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{dataset}{extension}"'},
+    )
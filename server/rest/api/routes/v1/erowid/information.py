@@ -1,19 +1,32 @@
 from fastapi import APIRouter, HTTPException, Body
 import httpx
-from api.utils.utils import scrape_erowid_substance, clean_data
+from typing import Optional
+from api.utils.utils import scrape_erowid_substance, clean_data, parse_fields
+from api.utils.extractors import SUBSTANCE_FIELDS
+from api.utils.hedging import hedged_get
+from db.corpus import load_substance_info
 
 router = APIRouter()
 
 @router.post("/erowid/information")
-async def get_information(data: dict = Body(...)):
+async def get_information(data: dict = Body(...), fields: Optional[str] = None):
     url = data.get("url")
     if not url:
         raise HTTPException(status_code=400, detail="Missing 'url' in request body")
+    selected = parse_fields(fields, SUBSTANCE_FIELDS) or SUBSTANCE_FIELDS
+    # Pages mirrored by the crawler are served without going upstream
+    stored = await load_substance_info(url)
+    if stored is not None:
+        return {
+            "success": True,
+            "domain": "erowid.org",
+            **{field: value for field, value in stored.items() if field in selected}
+        }
     try:
         async with httpx.AsyncClient(verify=False, timeout=15) as client:
-            resp = await client.get(url)
+            resp = await hedged_get(client, url, "substance_info")
             resp.raise_for_status()
-        info = scrape_erowid_substance(resp.text)
+        info = scrape_erowid_substance(resp.text, selected)
         info = clean_data(info, base_url=url)
         return {
             "success": True,
@@ -2,6 +2,8 @@ from fastapi import APIRouter, HTTPException
 import httpx
 from bs4 import BeautifulSoup
 from typing import Dict, List
+from api.utils.hedging import hedged_get
+from db.corpus import save_substances
 
 router = APIRouter()
 
@@ -40,7 +42,7 @@ async def get_substances():
     try:
         timeout = httpx.Timeout(30.0, connect=60.0)
         async with httpx.AsyncClient(verify=False, timeout=timeout) as client:
-            response = await client.get(url)
+            response = await hedged_get(client, url, "substances")
             response.raise_for_status()
             
         soup = BeautifulSoup(response.text, 'html.parser')
@@ -60,6 +62,8 @@ async def get_substances():
                     clean_category = category_name.replace(' ', '_').strip()
                     if clean_category not in ['common_psychoactives']:
                         categories[clean_category] = parse_dropdown_options(select, category_name)
+
+        await save_substances(categories)
         
         return {
             "status": "success",
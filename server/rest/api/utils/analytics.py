@@ -0,0 +1,313 @@
+"""
+Dose and demographics analytics over the stored report corpus.
+
+Reports are read from db/corpus.py and flattened into columns: one row per
+dose (report index, substance, route, unit, amount) and one row per report
+(gender, age, published year, views). Amounts are normalized to mg for
+masses and mL for volumes. Count units such as tabs or hits are kept as
+their own unit, because they cannot be compared with each other.
+
+Parsing the dose strings is the only per-row Python. Every aggregation is a
+grouped NumPy operation over the columns, such as a lexsort, bincount or
+reduceat. The results are written to db/analytics.py, and the endpoint only
+reads them back.
+"""
+import asyncio
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from api.utils.utils import logger
+from db.analytics import save_columns, save_results
+from db.corpus import iter_reports
+
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+QUANTILE_NAMES = ("p10", "p25", "median", "p75", "p90")
+
+# Lower bounds of the age buckets; the last bucket is open-ended
+AGE_BINS = (0, 18, 21, 25, 30, 40, 50)
+AGE_LABELS = ("<18", "18-20", "21-24", "25-29", "30-39", "40-49", "50+")
+
+UNKNOWN = "unknown"
+
+# unit -> (canonical unit, factor)
+UNITS = {
+    "ug": ("mg", 0.001), "µg": ("mg", 0.001), "μg": ("mg", 0.001), "mcg": ("mg", 0.001),
+    "mg": ("mg", 1.0), "g": ("mg", 1000.0), "gram": ("mg", 1000.0), "grams": ("mg", 1000.0),
+    "kg": ("mg", 1e6), "oz": ("mg", 28349.5), "lb": ("mg", 453592.0), "lbs": ("mg", 453592.0),
+    "ml": ("mL", 1.0), "cl": ("mL", 10.0), "dl": ("mL", 100.0), "l": ("mL", 1000.0),
+    "tsp": ("mL", 5.0), "tbsp": ("mL", 15.0),
+}
+
+# Count units, singular and plural, -> the unit they are grouped under
+COUNT_UNITS = {
+    **dict.fromkeys(("tab", "tabs", "tablet", "tablets"), "tab"),
+    **dict.fromkeys(("hit", "hits"), "hit"),
+    **dict.fromkeys(("pill", "pills"), "pill"),
+    **dict.fromkeys(("cap", "caps", "capsule", "capsules"), "capsule"),
+    **dict.fromkeys(("gelcap", "gelcaps", "gel", "gels"), "gelcap"),
+    **dict.fromkeys(("blotter", "blotters", "square", "squares"), "blotter"),
+    **dict.fromkeys(("drop", "drops"), "drop"),
+    **dict.fromkeys(("glass", "glasses"), "glass"),
+    **dict.fromkeys(("cup", "cups"), "cup"),
+    **dict.fromkeys(("drink", "drinks", "beer", "beers", "shot", "shots"), "drink"),
+    **dict.fromkeys(("bowl", "bowls"), "bowl"),
+    **dict.fromkeys(("joint", "joints"), "joint"),
+    **dict.fromkeys(("cigarette", "cigarettes"), "cigarette"),
+    **dict.fromkeys(("puff", "puffs", "toke", "tokes"), "puff"),
+    **dict.fromkeys(("line", "lines"), "line"),
+    **dict.fromkeys(("bump", "bumps"), "bump"),
+    **dict.fromkeys(("seed", "seeds"), "seed"),
+    **dict.fromkeys(("leaf", "leaves"), "leaf"),
+    **dict.fromkeys(("dose", "doses"), "dose"),
+}
+
+_AMOUNT = re.compile(
+    r"^\s*(?:about|approx\.?|~)?\s*"
+    r"(?P<low>\d+(?:\.\d+)?(?:/\d+)?)"
+    r"(?:\s*-\s*(?P<high>\d+(?:\.\d+)?))?"
+    r"\s*(?P<unit>[^\d\s()]+)?"
+)
+# "3 x 100 mg": a count of identical doses
+_MULTIPLIED = re.compile(r"^\s*(?P<count>\d+(?:\.\d+)?)\s*[x×*]\s*(?P<dose>\d.*)$", re.IGNORECASE)
+_YEAR = re.compile(r"\b(19|20)\d{2}\b")
+
+
+def _number(text: str) -> float:
+    if "/" in text:
+        numerator, denominator = text.split("/")
+        return float(numerator) / float(denominator) if float(denominator) else float("nan")
+    return float(text)
+
+
+def normalize_amount(amount: Optional[str]) -> Tuple[float, str]:
+    """
+    "100 ug" -> (0.1, "mg"), "5-10 ml" -> (7.5, "mL"), "2 tabs" -> (2.0, "tab"),
+    "3 x 100 mg" -> (300.0, "mg"). Amounts without a known unit ("repeated",
+    "", "3 mushrooms") give (nan, "unknown") and are left out of dose statistics.
+    """
+    multiplied = _MULTIPLIED.match(amount or "")
+    if multiplied:
+        value, unit = normalize_amount(multiplied["dose"])
+        return value * float(multiplied["count"]), unit
+
+    match = _AMOUNT.match(amount or "")
+    if not match:
+        return float("nan"), UNKNOWN
+    value = _number(match["low"])
+    if match["high"]:
+        value = (value + float(match["high"])) / 2
+    unit = (match["unit"] or "").strip(".").lower()
+    if unit in UNITS:
+        canonical, factor = UNITS[unit]
+        return value * factor, canonical
+    if unit in COUNT_UNITS:
+        return value, COUNT_UNITS[unit]
+    return float("nan"), UNKNOWN
+
+
+def normalize_label(text: Optional[str]) -> str:
+    return " ".join((text or "").split()).lower() or UNKNOWN
+
+
+def _int(text: Optional[str]) -> int:
+    digits = re.sub(r"[^\d]", "", text or "")
+    return int(digits) if digits else -1
+
+
+class _Vocabulary:
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+
+    def __call__(self, label: str) -> int:
+        return self.codes.setdefault(label, len(self.codes))
+
+    def array(self) -> np.ndarray:
+        return np.array(list(self.codes), dtype=str)
+
+
+class _ColumnBuilder:
+    def __init__(self):
+        self.substances, self.routes, self.units, self.genders = (_Vocabulary() for _ in range(4))
+        self.dose_report, self.dose_substance, self.dose_route, self.dose_unit, self.dose_amount = [], [], [], [], []
+        self.exp_ids, self.report_gender, self.report_age, self.report_year, self.report_views = [], [], [], [], []
+
+    def add(self, reports: List[Dict[str, Any]]) -> None:
+        for report in reports:
+            index = len(self.exp_ids)
+            metadata = report.get("metadata") or {}
+            self.exp_ids.append(report["exp_id"])
+            self.report_gender.append(self.genders(normalize_label(metadata.get("gender"))))
+            age = _int(metadata.get("age"))
+            self.report_age.append(age if 0 < age < 120 else np.nan)
+            year = _YEAR.search(metadata.get("published") or "")
+            self.report_year.append(int(year.group()) if year else -1)
+            self.report_views.append(_int(metadata.get("views")))
+            for dose in report.get("doses") or []:
+                amount, unit = normalize_amount(dose.get("amount"))
+                self.dose_report.append(index)
+                self.dose_substance.append(self.substances(normalize_label(dose.get("substance"))))
+                self.dose_route.append(self.routes(normalize_label(dose.get("method"))))
+                self.dose_unit.append(self.units(unit))
+                self.dose_amount.append(amount)
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        return {
+            "substances": self.substances.array(),
+            "routes": self.routes.array(),
+            "units": self.units.array(),
+            "genders": self.genders.array(),
+            "dose_report": np.array(self.dose_report, dtype=np.int32),
+            "dose_substance": np.array(self.dose_substance, dtype=np.int32),
+            "dose_route": np.array(self.dose_route, dtype=np.int32),
+            "dose_unit": np.array(self.dose_unit, dtype=np.int32),
+            "dose_amount": np.array(self.dose_amount, dtype=np.float64),
+            "exp_id": np.array(self.exp_ids, dtype=np.int64),
+            "report_gender": np.array(self.report_gender, dtype=np.int32),
+            "report_age": np.array(self.report_age, dtype=np.float64),
+            "report_year": np.array(self.report_year, dtype=np.int32),
+            "report_views": np.array(self.report_views, dtype=np.int64),
+        }
+
+
+async def build_columns() -> Dict[str, np.ndarray]:
+    """
+    Read every stored report and return the dose and report columns. Each
+    chunk is parsed in a thread so the rebuild never blocks the event loop.
+    """
+    builder = _ColumnBuilder()
+    async for reports in iter_reports():
+        await asyncio.to_thread(builder.add, reports)
+    return await asyncio.to_thread(builder.columns)
+
+
+# ---------------------------------------------------------------------------
+#   Vectorized aggregations
+# ---------------------------------------------------------------------------
+
+def grouped_quantiles(keys: np.ndarray, values: np.ndarray, quantiles=QUANTILES):
+    """
+    Per-group count, mean, min, max and linearly interpolated quantiles of
+    `values` grouped by integer `keys`, ignoring NaN values. Sorting once by
+    (key, value) puts every group in a contiguous, ordered run.
+    """
+    valid = ~np.isnan(values)
+    keys, values = keys[valid], values[valid]
+    order = np.lexsort((values, keys))
+    keys, values = keys[order], values[order]
+    groups, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+    if not len(groups):
+        empty = np.empty(0)
+        return groups, counts, empty, empty, empty, np.empty((0, len(quantiles)))
+
+    position = starts[:, None] + np.asarray(quantiles)[None, :] * (counts[:, None] - 1)
+    low = np.floor(position).astype(np.int64)
+    high = np.ceil(position).astype(np.int64)
+    result = values[low] + (values[high] - values[low]) * (position - low)
+    means = np.add.reduceat(values, starts) / counts
+    return groups, counts, means, values[starts], values[starts + counts - 1], result
+
+
+def dose_stats(columns: Dict[str, np.ndarray]) -> Dict[int, List[Dict[str, Any]]]:
+    """Dose distributions per substance, route and unit, keyed by substance code."""
+    n_routes, n_units = len(columns["routes"]), len(columns["units"])
+    keys = (columns["dose_substance"].astype(np.int64) * n_routes + columns["dose_route"]) * n_units \
+        + columns["dose_unit"]
+    groups, counts, means, minimums, maximums, quantiles = grouped_quantiles(keys, columns["dose_amount"])
+    if not len(groups):
+        return {}
+    substance, route, unit = np.unravel_index(groups, (len(columns["substances"]), n_routes, n_units))
+
+    stats: Dict[int, List[Dict[str, Any]]] = {}
+    for i in np.argsort(-counts, kind="stable"):
+        stats.setdefault(int(substance[i]), []).append({
+            "route": str(columns["routes"][route[i]]),
+            "unit": str(columns["units"][unit[i]]),
+            "count": int(counts[i]),
+            "mean": round(float(means[i]), 4),
+            "min": round(float(minimums[i]), 4),
+            **{name: round(float(q), 4) for name, q in zip(QUANTILE_NAMES, quantiles[i])},
+            "max": round(float(maximums[i]), 4),
+        })
+    return stats
+
+
+def demographics(columns: Dict[str, np.ndarray], groups: np.ndarray, reports: np.ndarray, n_groups: int):
+    """
+    Gender counts, age buckets and median age per group, for (group, report)
+    pairs that each name a distinct report once.
+    """
+    genders = columns["genders"]
+    gender = columns["report_gender"][reports]
+    gender_counts = np.bincount(groups * len(genders) + gender, minlength=n_groups * len(genders))
+    gender_counts = gender_counts.reshape(n_groups, len(genders))
+
+    age = columns["report_age"][reports]
+    known = ~np.isnan(age)
+    bucket = np.digitize(age[known], AGE_BINS) - 1
+    age_counts = np.bincount(groups[known] * len(AGE_BINS) + bucket, minlength=n_groups * len(AGE_BINS))
+    age_counts = age_counts.reshape(n_groups, len(AGE_BINS))
+    age_groups, _, age_means, _, _, age_medians = grouped_quantiles(groups, age, (0.5,))
+    median_age = dict(zip(age_groups.tolist(), age_medians[:, 0].tolist()))
+    mean_age = dict(zip(age_groups.tolist(), age_means.tolist()))
+    report_counts = np.bincount(groups, minlength=n_groups)
+
+    return [
+        {
+            "reports": int(report_counts[g]),
+            "gender": {str(genders[i]): int(c) for i, c in enumerate(gender_counts[g]) if c},
+            "age": {
+                "known": int(age_counts[g].sum()),
+                "mean": round(mean_age[g], 1) if g in mean_age else None,
+                "median": round(median_age[g], 1) if g in median_age else None,
+                "buckets": dict(zip(AGE_LABELS, age_counts[g].tolist())),
+            },
+        }
+        for g in range(n_groups)
+    ]
+
+
+def aggregate(columns: Dict[str, np.ndarray]) -> Dict[str, Dict[str, Any]]:
+    """Precomputed analytics per substance, plus the corpus-wide overview under ""."""
+    n_reports, n_substances = len(columns["exp_id"]), len(columns["substances"])
+
+    # Each report counts once per distinct substance in its dose chart
+    pairs = np.unique(columns["dose_substance"].astype(np.int64) * max(n_reports, 1) + columns["dose_report"])
+    substance_of, report_of = np.divmod(pairs, max(n_reports, 1))
+    per_substance = demographics(columns, substance_of, report_of, n_substances)
+    doses = dose_stats(columns)
+
+    results = {
+        str(name): {"substance": str(name), **per_substance[code], "doses": doses.get(code, [])}
+        for code, name in enumerate(columns["substances"])
+    }
+
+    overview = demographics(columns, np.zeros(n_reports, dtype=np.int64), np.arange(n_reports), 1)[0]
+    years = columns["report_year"][columns["report_year"] > 0]
+    ranked = sorted(results.values(), key=lambda r: r["reports"], reverse=True)
+    results[""] = {
+        **overview,
+        "doses": int(len(columns["dose_amount"])),
+        "doses_normalized": int(np.count_nonzero(~np.isnan(columns["dose_amount"]))),
+        "published": {str(y): int(c) for y, c in zip(*np.unique(years, return_counts=True))},
+        "substances": [{"substance": r["substance"], "reports": r["reports"]} for r in ranked],
+        "built_at": time.time(),
+    }
+    return results
+
+
+async def rebuild() -> Dict[str, Any]:
+    """Recompute the columns and every aggregate from the report store."""
+    started = time.perf_counter()
+    columns = await build_columns()
+    results = await asyncio.to_thread(aggregate, columns)
+    await asyncio.to_thread(save_columns, columns)
+    await save_results(results)
+    overview = results[""]
+    logger.info(
+        f"Analytics rebuilt from {overview['reports']} reports and {overview['doses']} doses "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+    return overview
@@ -0,0 +1,183 @@
+"""
+Crawl workers that mirror Erowid into the local stores.
+
+Tasks come from db/crawl_queue.py and fan out:
+- substance: scrape the info page (`scrape_erowid_substance`) and queue one
+  listing per experience category;
+- listing: a whole static listing, or one page of an exp.cgi listing,
+  indexed into the author index, queueing every report and the next page;
+- report: extract and store the report, unless it is already stored.
+
+Each task is one unit of retry and checkpoint. Any number of processes can
+run `python cli.py crawl work` against the same Redis, and together they stay
+within CRAWL_RATE_PER_SECOND upstream requests.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict
+
+import httpx
+from prometheus_client import Counter, Gauge, Histogram
+
+from api.utils.extractors import extract_report
+from api.utils.hedging import hedged_get
+from api.utils.utils import (
+    clean_data,
+    experiences_link,
+    fetch_paginated_experiences,
+    logger,
+    scrape_erowid_substance,
+)
+from core.config import settings
+from db import crawl_queue
+from db.author_index import index_listing
+from db.corpus import save_substance_info
+from db.crawl_queue import CrawlTask, politeness_wait
+from db.report_store import load_report, save_report
+from db.substance_graph import record_experiences, resolve_categories
+
+crawl_tasks = Counter(
+    "lysergic_crawl_tasks_total",
+    "Crawl tasks processed by outcome",
+    ["kind", "outcome"]
+)
+crawl_task_duration = Histogram(
+    "lysergic_crawl_task_duration_seconds",
+    "Crawl task duration, including politeness waits",
+    ["kind"],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+)
+crawl_queue_size = Gauge(
+    "lysergic_crawl_queue",
+    "Crawl tasks by state, as last seen by this worker",
+    ["state"]
+)
+
+
+async def _crawl_substance(task: CrawlTask) -> str:
+    await politeness_wait()
+    async with httpx.AsyncClient(verify=False, timeout=30.0) as client:
+        response = await hedged_get(client, task.url, "substance_info")
+        response.raise_for_status()
+    await save_substance_info(task.url, clean_data(scrape_erowid_substance(response.text), base_url=task.url))
+
+    # The MORE link is on the page just fetched; keep the graph in step with it
+    has_experiences, experiences_url = experiences_link(response.text)
+    await record_experiences(task.url, has_experiences, experiences_url)
+    if not has_experiences or not experiences_url:
+        return "done"
+
+    categories = await resolve_categories(experiences_url, before_load=politeness_wait)
+    await crawl_queue.enqueue([
+        CrawlTask("listing", category["url"]) for category in categories.values() if category.get("url")
+    ])
+    return "done"
+
+
+async def _crawl_listing(task: CrawlTask) -> str:
+    # A static page is one request and comes back whole. An exp.cgi listing
+    # takes two for its first page (the static page, then the CGI page it
+    # links to); later pages are queued by their CGI URL and take one.
+    await politeness_wait(1 if "exp.cgi" in task.url else 2)
+    page = await fetch_paginated_experiences(task.url, task.start, settings.CRAWL_PAGE_SIZE, whole_static=True)
+    rows = page["experiences"]
+    await index_listing(rows)
+
+    follow = [CrawlTask("report", row["url"]) for row in rows if row.get("url")]
+    pagination = page["pagination"]
+    if pagination["has_next"]:
+        follow.append(CrawlTask("listing", pagination["next_url"], task.start + settings.CRAWL_PAGE_SIZE))
+    await crawl_queue.enqueue(follow)
+    return "done"
+
+
+async def _crawl_report(task: CrawlTask) -> str:
+    if await load_report(task.url) is not None:
+        return "skipped"
+    await politeness_wait()
+    async with httpx.AsyncClient(verify=False, timeout=30.0) as client:
+        response = await hedged_get(client, task.url, "report")
+        response.encoding = 'cp1252'
+        response.raise_for_status()
+    await save_report(task.url, extract_report(response.text))
+    return "done"
+
+
+HANDLERS: Dict[str, Callable[[CrawlTask], Awaitable[str]]] = {
+    "substance": _crawl_substance,
+    "listing": _crawl_listing,
+    "report": _crawl_report,
+}
+
+
+async def process(task: CrawlTask) -> None:
+    started = time.perf_counter()
+    try:
+        outcome = await HANDLERS[task.kind](task)
+    except Exception as e:
+        error = getattr(e, "detail", None) or str(e) or type(e).__name__
+        retried = await crawl_queue.fail(task, error)
+        outcome = "retried" if retried else "dead"
+        logger.warning(f"Crawl {task.id} failed (attempt {task.attempts}, {outcome}): {error}")
+    else:
+        await crawl_queue.complete(task)
+    crawl_tasks.labels(kind=task.kind, outcome=outcome).inc()
+    crawl_task_duration.labels(kind=task.kind).observe(time.perf_counter() - started)
+
+
+async def _report_queue(stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        try:
+            state = await crawl_queue.status()
+        except Exception as e:
+            logger.warning(f"Failed to read crawl queue status: {e}")
+        else:
+            for name in ("queued", "leased", "dead", "seen"):
+                crawl_queue_size.labels(state=name).set(state[name])
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=15)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_worker(concurrency: int, until_empty: bool = False) -> None:
+    """
+    Claim and process tasks with `concurrency` loops until interrupted, or,
+    with `until_empty`, until nothing is queued or leased anywhere.
+    """
+    stop = asyncio.Event()
+
+    async def step() -> bool:
+        """Claim and process one task. Returns False when there was nothing to do."""
+        task = await crawl_queue.claim()
+        if task is not None:
+            await process(task)
+            return True
+        if until_empty:
+            state = await crawl_queue.status()
+            if not state["queued"] and not state["leased"]:
+                stop.set()
+        return False
+
+    async def loop():
+        while not stop.is_set():
+            try:
+                if await step():
+                    continue
+            except Exception as e:
+                # Redis hiccups must not kill the loop: the lease, if any,
+                # expires and the task is claimed again
+                logger.error(f"Crawl worker error: {e}")
+            if stop.is_set():
+                return
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=settings.CRAWL_IDLE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    reporter = asyncio.create_task(_report_queue(stop))
+    try:
+        await asyncio.gather(*(loop() for _ in range(concurrency)))
+    finally:
+        stop.set()
+        await reporter
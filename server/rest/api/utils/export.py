@@ -0,0 +1,131 @@
+"""
+Bulk export of the local corpus as compressed JSONL or Parquet.
+
+Records are read from db/corpus.py chunk by chunk and encoded as they
+arrive, so neither format holds more than one chunk in memory. JSONL is
+streamed (gzip or zstd), each chunk encoded and compressed in a thread so a
+long export does not stall the server; Parquet is written one row group per
+chunk.
+"""
+import asyncio
+import json
+import zlib
+from typing import Any, AsyncIterator, Dict, Optional
+
+from db.corpus import Chunk, iter_listings, iter_reports, iter_substances
+
+try:
+    import zstandard
+except ImportError:  # optional, only needed for compression="zstd"
+    zstandard = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional, only needed for Parquet output
+    pa = pq = None
+
+DATASETS = ("substances", "listings", "reports")
+COMPRESSIONS = ("gzip", "zstd", "none")
+
+REPORT_METADATA = ("exp_id", "gender", "age", "published", "views", "topics")
+
+
+def _chunks(dataset: str, since_id: Optional[int], since: Optional[float]) -> AsyncIterator[Chunk]:
+    if dataset == "substances":
+        return iter_substances()
+    if dataset == "listings":
+        return iter_listings(since_id=since_id)
+    if dataset == "reports":
+        return iter_reports(since_id=since_id, since=since)
+    raise ValueError(f"Unknown dataset '{dataset}', expected one of {', '.join(DATASETS)}")
+
+
+def _compressor(compression: str):
+    if compression == "gzip":
+        return zlib.compressobj(6, zlib.DEFLATED, 31)
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd export requires the 'zstandard' package")
+        return zstandard.ZstdCompressor(level=10).compressobj()
+    if compression == "none":
+        return None
+    raise ValueError(f"Unknown compression '{compression}', expected one of {', '.join(COMPRESSIONS)}")
+
+
+def validate(dataset: str, compression: str) -> None:
+    """Raise ValueError before any streaming starts for a bad request."""
+    if dataset not in DATASETS:
+        raise ValueError(f"Unknown dataset '{dataset}', expected one of {', '.join(DATASETS)}")
+    _compressor(compression)
+
+
+async def export_jsonl(
+    dataset: str,
+    compression: str = "gzip",
+    since_id: Optional[int] = None,
+    since: Optional[float] = None,
+) -> AsyncIterator[bytes]:
+    """Yield the dataset as (compressed) JSON lines, one chunk at a time."""
+    compressor = _compressor(compression)
+
+    def encode(records: Chunk) -> bytes:
+        lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode()
+        return compressor.compress(lines) if compressor else lines
+
+    async for records in _chunks(dataset, since_id, since):
+        data = await asyncio.to_thread(encode, records)
+        if data:
+            yield data
+    if compressor:
+        yield await asyncio.to_thread(compressor.flush)
+
+
+# ---------------------------------------------------------------------------
+#   Parquet
+# ---------------------------------------------------------------------------
+
+def _schema(dataset: str):
+    string = pa.string()
+    if dataset == "substances":
+        return pa.schema([("name", string), ("category", string), ("info_url", string)])
+    if dataset == "listings":
+        return pa.schema([
+            ("exp_id", pa.int64()), ("title", string), ("url", string), ("author", string),
+            ("substance", string), ("rating", string), ("date", string),
+        ])
+    dose = pa.struct([("amount", string), ("method", string), ("substance", string), ("form", string)])
+    return pa.schema(
+        [("exp_id", pa.int64()), ("url", string), ("title", string), ("author", string),
+         ("substance", string), ("doses", pa.list_(dose)), ("content", string)]
+        + [(f"metadata_{name}", string) for name in REPORT_METADATA]
+        + [("stored_at", pa.float64())]
+    )
+
+
+def _flatten_report(report: Dict[str, Any]) -> Dict[str, Any]:
+    metadata = report.get("metadata") or {}
+    row = {k: v for k, v in report.items() if k != "metadata"}
+    for name in REPORT_METADATA:
+        row[f"metadata_{name}"] = metadata.get(name)
+    return row
+
+
+async def export_parquet(
+    dataset: str,
+    path: str,
+    since_id: Optional[int] = None,
+    since: Optional[float] = None,
+) -> int:
+    """Write the dataset to a Parquet file, one row group per chunk. Returns the row count."""
+    if pq is None:
+        raise ValueError("Parquet export requires the 'pyarrow' package")
+    schema = _schema(dataset)
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        async for records in _chunks(dataset, since_id, since):
+            if dataset == "reports":
+                records = [_flatten_report(r) for r in records]
+            writer.write_table(pa.Table.from_pylist(records, schema=schema))
+            rows += len(records)
+    return rows
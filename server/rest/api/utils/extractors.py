@@ -0,0 +1,333 @@
+"""
+Declarative extraction specs for the Erowid page types we scrape.
+
+Each spec pairs a parse-only strainer, so BeautifulSoup only builds the
+subtrees we actually read, with a table of per-class field handlers that
+are applied in a single walk over what was parsed.
+"""
+import copy
+import re
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional
+
+from bs4 import BeautifulSoup, CData, ElementFilter, NavigableString, SoupStrainer, Tag
+
+
+def _has_class(*names: str) -> SoupStrainer:
+    """
+    Strainer matching tags carrying any of `names` as a class.
+    While parsing, bs4 hands strainers the raw attribute string, so
+    multi-class values such as "exp-list-row odd" are split here.
+    """
+    wanted = frozenset(names)
+    return SoupStrainer(class_=lambda value: bool(value) and not wanted.isdisjoint(value.split()))
+
+
+class _AnyOf(ElementFilter):
+    """Parse-only filter that keeps a tag when any of its strainers would."""
+
+    def __init__(self, *strainers: ElementFilter):
+        super().__init__()
+        self.strainers = strainers
+
+    @property
+    def includes_everything(self) -> bool:
+        return False
+
+    def allow_tag_creation(self, nsprefix, name, attrs) -> bool:
+        return any(s.allow_tag_creation(nsprefix, name, attrs) for s in self.strainers)
+
+    def allow_string_creation(self, string: str) -> bool:
+        return False
+
+
+Handler = Callable[[Tag], Any]
+
+
+class Field:
+    """A field read by `handler` from the first `<tag class="cls">` in the page."""
+
+    def __init__(self, tag: str, cls: str, handler: Handler, default: Any = None):
+        self.tag = tag
+        self.cls = cls
+        self.handler = handler
+        self.default = default
+
+
+class PageSpec:
+    """
+    Extraction spec for one page type.
+    Only the subtrees of the requested fields are parsed, and each field is
+    filled from the first matching tag in a single walk over them.
+    """
+
+    def __init__(self, fields: Dict[str, Field]):
+        self.fields = fields
+        self._strainers: Dict[FrozenSet[str], ElementFilter] = {}
+
+    def strainer(self, selected: FrozenSet[str]) -> ElementFilter:
+        if selected not in self._strainers:
+            self._strainers[selected] = _has_class(*(self.fields[name].cls for name in selected))
+        return self._strainers[selected]
+
+    def extract(self, html: str, fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        selected = frozenset(self.fields if fields is None else fields)
+        data = {name: copy.copy(self.fields[name].default) for name in self.fields if name in selected}
+        pending = {f"{self.fields[name].tag}.{self.fields[name].cls}": name for name in selected}
+        soup = BeautifulSoup(html, "html.parser", parse_only=self.strainer(selected))
+        for el in soup.descendants:
+            if not isinstance(el, Tag):
+                continue
+            for cls in el.get("class", ()):
+                name = pending.pop(f"{el.name}.{cls}", None)
+                if name:
+                    data[name] = self.fields[name].handler(el)
+            if not pending:
+                break
+        return data
+
+
+# ---------------------------------------------------------------------------
+#   Experience report pages (exp.php?ID=...)
+# ---------------------------------------------------------------------------
+
+# (cell prefix, label stripped from the value, metadata key)
+FOOTDATA_PREFIXES = (
+    ("Gender:", "Gender:", "gender"),
+    ("Age", "Age at time of experience:", "age"),
+    ("Published:", "Published:", "published"),
+    ("Views:", "Views:", "views"),
+    ("ExpID:", "ExpID:", "exp_id"),
+)
+
+DOSECHART_COLUMNS = (
+    ("dosechart-amount", "amount"),
+    ("dosechart-method", "method"),
+    ("dosechart-substance", "substance"),
+    ("dosechart-form", "form"),
+)
+
+_TEXT_TYPES = (NavigableString, CData)
+
+
+def _text_or_none(tag: Tag) -> Optional[str]:
+    return tag.get_text(strip=True) or None
+
+
+# Tags that start a new paragraph in the report body; two <br> in a row do too
+_BLOCK_TAGS = frozenset(("p", "div", "blockquote", "center", "ul", "ol", "li", "h1", "h2", "h3", "h4", "h5", "h6"))
+
+
+class _Paragraphs:
+    """
+    Collects the report body as paragraphs of lines. Inline markup only
+    joins text within a line; a single <br> ends the line, while block tags
+    and <br><br> end the paragraph.
+    """
+
+    def __init__(self):
+        self.paragraphs: List[str] = []
+        self.lines: List[str] = []
+        self.line: List[str] = []
+        self.breaks = 0
+
+    def end_line(self) -> None:
+        text = " ".join("".join(self.line).split())
+        self.line.clear()
+        if text:
+            self.lines.append(text)
+
+    def end_paragraph(self) -> None:
+        self.end_line()
+        if self.lines:
+            self.paragraphs.append("\n".join(self.lines))
+            self.lines.clear()
+        self.breaks = 0
+
+    def walk(self, node: Tag) -> None:
+        for child in node.children:
+            if isinstance(child, Tag):
+                if child.name == "table":  # dose chart and other embedded tables
+                    self.end_paragraph()
+                elif child.name == "br":
+                    self.breaks += 1
+                    if self.breaks >= 2:
+                        self.end_paragraph()
+                    else:
+                        self.end_line()
+                elif child.name in _BLOCK_TAGS:
+                    self.end_paragraph()
+                    self.walk(child)
+                    self.end_paragraph()
+                else:
+                    self.walk(child)
+            elif type(child) in _TEXT_TYPES:
+                if child.strip():
+                    self.breaks = 0
+                self.line.append(str(child))
+
+
+def report_paragraphs(content_div: Tag) -> List[str]:
+    collector = _Paragraphs()
+    collector.walk(content_div)
+    collector.end_paragraph()
+    return collector.paragraphs
+
+
+def report_text(content_div: Tag) -> str:
+    """Report body with paragraphs separated by a blank line, lines by a newline."""
+    return "\n\n".join(report_paragraphs(content_div))
+
+
+def _report_author(tag: Tag) -> Optional[str]:
+    link = tag.find("a")
+    return link.get_text(strip=True) if link else None
+
+
+def _report_doses(tag: Tag) -> List[Dict[str, Optional[str]]]:
+    doses = []
+    for row in tag.find_all("tr"):
+        dose = dict.fromkeys(name for _, name in DOSECHART_COLUMNS)
+        for cell in row.find_all("td"):
+            for cls, name in DOSECHART_COLUMNS:
+                if cls in cell.get("class", []) and dose[name] is None:
+                    dose[name] = cell.get_text(strip=True)
+        if any(dose.values()):
+            doses.append(dose)
+    return doses
+
+
+def _report_metadata(tag: Tag) -> Dict[str, str]:
+    metadata = {}
+    for cell in tag.find_all("td"):
+        txt = cell.get_text(strip=True)
+        for prefix, label, name in FOOTDATA_PREFIXES:
+            if txt.startswith(prefix):
+                metadata[name] = txt.replace(label, "").strip()
+                break
+        else:
+            if "topic-list" in cell.get("class", []):
+                metadata["topics"] = txt
+    return metadata
+
+
+REPORT_SPEC = PageSpec({
+    "title": Field("div", "title", _text_or_none),
+    "author": Field("div", "author", _report_author),
+    "substance": Field("div", "substance", lambda tag: tag.get_text(strip=True)),
+    "doses": Field("table", "dosechart", _report_doses, default=[]),
+    "content": Field("div", "report-text-surround", report_text),
+    "metadata": Field("table", "footdata", _report_metadata, default={}),
+})
+
+REPORT_FIELDS = frozenset(REPORT_SPEC.fields)
+
+
+def extract_report(html: str, fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    Pull title, author, substance, doses, content and metadata from a report page.
+    With `fields`, only those are returned and the rest are never parsed.
+    """
+    return REPORT_SPEC.extract(html, fields)
+
+
+# ---------------------------------------------------------------------------
+#   Experience listings (category pages, exp.cgi searches)
+# ---------------------------------------------------------------------------
+
+LISTING_CELLS = (
+    ("exp-title", "title"),
+    ("exp-author", "author"),
+    ("exp-substance", "substance"),
+    ("exp-pubdate", "date"),
+)
+
+LISTING_FIELDS = frozenset(("title", "url", "author", "substance", "rating", "date"))
+
+LISTING_STRAINER = _AnyOf(
+    _has_class("exp-list-table", "exp-list-page-title-sub"),
+    SoupStrainer("a", href=re.compile("Start=")),
+)
+
+
+def experience_url(href: str) -> str:
+    raw_href = href.lstrip("/")
+    return (
+        f"https://www.erowid.org/{raw_href}"
+        if raw_href.startswith("experiences/")
+        else f"https://www.erowid.org/experiences/{raw_href}"
+    )
+
+
+def parse_listing_row(row: Tag, fields: Optional[Iterable[str]] = None) -> Optional[Dict[str, Optional[str]]]:
+    """
+    Read one exp-list row in a single pass over its cells and images.
+    The title cell is always read since rows without a report link are skipped;
+    other cells are only read when in `fields`.
+    """
+    selected = LISTING_FIELDS if fields is None else frozenset(fields) | {"title"}
+    cells = [(cls, name) for cls, name in LISTING_CELLS if name in selected]
+    exp: Dict[str, Optional[str]] = dict.fromkeys(("title", "url", "author", "substance", "rating", "date"))
+    for el in row.find_all(["td", "img"] if "rating" in selected else "td"):
+        if el.name == "img":
+            if exp["rating"] is None and el.has_attr("alt"):
+                exp["rating"] = el["alt"]
+            continue
+        classes = el.get("class", [])
+        for cls, name in cells:
+            if cls not in classes or exp[name] is not None:
+                continue
+            if name == "title":
+                link = el.find("a")
+                if link:
+                    exp["title"] = link.text.strip()
+                    exp["url"] = experience_url(link["href"])
+            else:
+                exp[name] = el.text.strip()
+    if exp["url"] is None:
+        return None
+    exp["rating"] = exp["rating"] or "Unrated"
+    if fields is None:
+        return exp
+    return {name: value for name, value in exp.items() if name in fields}
+
+
+def listing_rows(table: Tag) -> List[Tag]:
+    return table.select('tr[class^="exp-list-row"]')
+
+
+def parse_listing(html: str) -> BeautifulSoup:
+    """Parse only the listing table, total-count header and pagination links."""
+    return BeautifulSoup(html, "html.parser", parse_only=LISTING_STRAINER)
+
+
+# ---------------------------------------------------------------------------
+#   Substance info pages (/chemicals/lsd/lsd.shtml, ...)
+# ---------------------------------------------------------------------------
+
+# Top-level field of scrape_erowid_substance -> classes whose subtrees it reads
+SUBSTANCE_FIELD_CLASSES = {
+    "substance_name": ("title-section",),
+    "summary": ("summary-card-text-surround",),
+    "summary_links": ("summary-card-icon-surround",),
+    "sections": ("links-list",),
+    "offsite_sections": ("index-links-ext",),
+}
+
+SUBSTANCE_FIELDS = frozenset(SUBSTANCE_FIELD_CLASSES)
+
+LINKS_LIST_STRAINER = _has_class("links-list")
+
+CATEGORY_STRAINER = SoupStrainer("tr")
+
+
+def parse_substance(html: str, fields: FrozenSet[str] = SUBSTANCE_FIELDS) -> BeautifulSoup:
+    classes = [cls for name in fields for cls in SUBSTANCE_FIELD_CLASSES[name]]
+    return BeautifulSoup(html, "html.parser", parse_only=_has_class(*classes))
+
+
+def parse_links_lists(html: str) -> BeautifulSoup:
+    return BeautifulSoup(html, "html.parser", parse_only=LINKS_LIST_STRAINER)
+
+
+def parse_categories(html: str) -> BeautifulSoup:
+    return BeautifulSoup(html, "html.parser", parse_only=CATEGORY_STRAINER)
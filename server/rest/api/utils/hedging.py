@@ -0,0 +1,132 @@
+"""
+Hedged GETs for Erowid pages.
+
+When HEDGING_ENABLED is set, a request that has not answered within the
+rolling p95 for its page type gets a second, identical request. Whichever
+response arrives first wins and the other is cancelled. A token budget caps
+hedges to HEDGE_MAX_RATIO of upstream traffic so a slow Erowid does not get
+twice the load.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict
+
+import httpx
+from prometheus_client import Counter, Histogram
+
+from core.config import settings
+
+upstream_duration = Histogram(
+    "lysergic_upstream_request_duration_seconds",
+    "Erowid GET duration as seen by the caller, including hedging",
+    ["page_type"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0)
+)
+hedges_sent = Counter(
+    "lysergic_upstream_hedges_total",
+    "Hedge requests sent after the primary exceeded the rolling p95",
+    ["page_type"]
+)
+hedges_won = Counter(
+    "lysergic_upstream_hedge_wins_total",
+    "Hedge requests that answered before the primary",
+    ["page_type"]
+)
+hedges_skipped = Counter(
+    "lysergic_upstream_hedges_skipped_total",
+    "Hedges not sent because the hedge budget was exhausted",
+    ["page_type"]
+)
+
+
+class LatencyWindow:
+    """Rolling window of recent latencies for one page type."""
+
+    def __init__(self, size: int):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def observe(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def p95(self) -> float | None:
+        if len(self.samples) < settings.HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+class HedgeBudget:
+    """Every upstream request earns HEDGE_MAX_RATIO tokens; a hedge spends one."""
+
+    def __init__(self, ratio: float, burst: float = 5.0):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+
+    def earn(self) -> None:
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+_windows: Dict[str, LatencyWindow] = {}
+_budget = HedgeBudget(settings.HEDGE_MAX_RATIO)
+
+
+def _window(page_type: str) -> LatencyWindow:
+    if page_type not in _windows:
+        _windows[page_type] = LatencyWindow(settings.HEDGE_WINDOW_SIZE)
+    return _windows[page_type]
+
+
+async def _first_success(tasks: list[asyncio.Task]) -> tuple[asyncio.Task, httpx.Response]:
+    """Wait for the first task to return a response; fail only if all fail."""
+    pending = set(tasks)
+    error: BaseException | None = None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is None:
+                return task, task.result()
+            error = task.exception()
+    raise error
+
+
+async def hedged_get(client: httpx.AsyncClient, url: str, page_type: str) -> httpx.Response:
+    """GET `url`, hedging once past the rolling p95 for `page_type`."""
+    window = _window(page_type)
+    started = time.perf_counter()
+
+    if not settings.HEDGING_ENABLED:
+        response = await client.get(url)
+    else:
+        _budget.earn()
+        delay = window.p95()
+        primary = asyncio.create_task(client.get(url))
+        tasks = [primary]
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    if _budget.try_spend():
+                        hedges_sent.labels(page_type=page_type).inc()
+                        tasks.append(asyncio.create_task(client.get(url)))
+                    else:
+                        hedges_skipped.labels(page_type=page_type).inc()
+            winner, response = await _first_success(tasks)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        if winner is not primary:
+            hedges_won.labels(page_type=page_type).inc()
+
+    elapsed = time.perf_counter() - started
+    window.observe(elapsed)
+    upstream_duration.labels(page_type=page_type).observe(elapsed)
+    return response
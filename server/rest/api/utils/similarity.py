@@ -0,0 +1,176 @@
+"""
+"More like this" over stored report content.
+
+The offline build turns each report into a hashed TF-IDF vector. It keeps only
+the report's SIMILARITY_TERMS_PER_REPORT heaviest terms, renormalizes them to
+unit length, and stores the whole corpus twice in compact arrays: report-major
+CSR rows and a term-major inverted index (db/similarity.py). Terms that appear
+in more than SIMILARITY_MAX_DF of reports carry no signal, so they are dropped.
+
+A lookup takes the query report's top QUERY_TERMS terms. It gathers their
+posting lists with one fancy index, sums cosine contributions per report with
+bincount, and returns the best k via argpartition. The cost depends on the
+postings touched, not on the corpus size.
+"""
+import asyncio
+import re
+import time
+import zlib
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from api.utils.utils import logger
+from core.config import settings
+from db.corpus import iter_reports
+from db.similarity import SimilarityIndex, save_index
+
+HASH_BITS = 20
+QUERY_TERMS = 32
+
+_TOKEN = re.compile(r"[a-z][a-z']{2,}")
+STOPWORDS = frozenset("""
+    the and that was for with this but not you are had have all were out about
+    what when there they them then than just like from into could would some
+    very his her him she its our your been also which more can only over did
+    felt feel feeling time after before again even still much really thing things
+    got get going because while being now how who will one two first back way
+""".split())
+
+
+class _Hasher:
+    """Stable token -> feature id (crc32 modulo 2**HASH_BITS), memoized per build."""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+
+    def __call__(self, token: str) -> int:
+        feature = self.ids.get(token)
+        if feature is None:
+            feature = self.ids[token] = zlib.crc32(token.encode()) & ((1 << HASH_BITS) - 1)
+        return feature
+
+
+def term_counts(content: str, hasher: _Hasher) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashed feature ids and counts for one report's text."""
+    counts: Dict[int, int] = {}
+    for token in _TOKEN.findall((content or "").lower()):
+        if token not in STOPWORDS:
+            feature = hasher(token)
+            counts[feature] = counts.get(feature, 0) + 1
+    return np.fromiter(counts.keys(), np.int32, len(counts)), np.fromiter(counts.values(), np.float32, len(counts))
+
+
+def _segment_starts(rows: np.ndarray, n_rows: int) -> np.ndarray:
+    return np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=n_rows))))
+
+
+def weigh(rows: np.ndarray, terms: np.ndarray, counts: np.ndarray, n_rows: int,
+          max_df: float, terms_per_row: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Sublinear TF-IDF over (row, term, count) triples sorted by row, pruned
+    to each row's heaviest `terms_per_row` terms and L2-normalized.
+    Returns CSR (indptr, indices, data).
+    """
+    df = np.bincount(terms, minlength=1 << HASH_BITS)
+    keep = df[terms] <= max(max_df * n_rows, 1)
+    rows, terms, counts = rows[keep], terms[keep], counts[keep]
+    idf = np.log((1 + n_rows) / (1 + df[terms])) + 1
+    weights = ((1 + np.log(counts)) * idf).astype(np.float32)
+
+    # Heaviest terms first within each row, then keep the first terms_per_row
+    order = np.lexsort((-weights, rows))
+    rows, terms, weights = rows[order], terms[order], weights[order]
+    indptr = _segment_starts(rows, n_rows)
+    rank = np.arange(len(rows)) - indptr[rows]
+    keep = rank < terms_per_row
+    rows, terms, weights = rows[keep], terms[keep], weights[keep]
+
+    indptr = _segment_starts(rows, n_rows)
+    norms = np.sqrt(np.bincount(rows, weights=weights.astype(np.float64) ** 2, minlength=n_rows))
+    weights = (weights / norms[rows]).astype(np.float32)
+    return indptr, terms.astype(np.int32), weights
+
+
+def invert(indptr: np.ndarray, indices: np.ndarray, data: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Term-major copy of a CSR matrix: (term_indptr, report rows, data)."""
+    rows = np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr))
+    order = np.argsort(indices, kind="stable")
+    return _segment_starts(indices, 1 << HASH_BITS), rows[order], data[order]
+
+
+def _concat(parts: List[np.ndarray], dtype) -> np.ndarray:
+    return np.concatenate(parts) if parts else np.empty(0, dtype)
+
+
+async def build_index() -> Dict[str, Any]:
+    """Vectorize every stored report and write a fresh index. Returns its manifest."""
+    started = time.perf_counter()
+    hasher = _Hasher()
+    exp_ids: List[int] = []
+    meta: List[Dict[str, Any]] = []
+    row_ids, term_ids, term_tf = [], [], []
+
+    def add(reports: List[Dict[str, Any]]) -> None:
+        for report in reports:
+            terms, counts = term_counts(report.get("content"), hasher)
+            if not len(terms):
+                continue
+            row_ids.append(np.full(len(terms), len(exp_ids), dtype=np.int32))
+            term_ids.append(terms)
+            term_tf.append(counts)
+            exp_ids.append(report["exp_id"])
+            meta.append({k: report.get(k) for k in ("url", "title", "author", "substance")})
+
+    # Tokenizing is the bulk of the build: keep it off the event loop
+    async for reports in iter_reports():
+        await asyncio.to_thread(add, reports)
+
+    n_rows = len(exp_ids)
+    indptr, indices, data = await asyncio.to_thread(
+        weigh, _concat(row_ids, np.int32), _concat(term_ids, np.int32), _concat(term_tf, np.float32),
+        n_rows, settings.SIMILARITY_MAX_DF, settings.SIMILARITY_TERMS_PER_REPORT,
+    )
+    term_indptr, term_rows, term_data = await asyncio.to_thread(invert, indptr, indices, data)
+
+    manifest = await asyncio.to_thread(save_index, {
+        "exp_ids": np.array(exp_ids, dtype=np.int64),
+        "indptr": indptr,
+        "indices": indices,
+        "data": data,
+        "term_indptr": term_indptr,
+        "term_rows": term_rows,
+        "term_data": term_data,
+    }, meta)
+    logger.info(
+        f"Similarity index built over {n_rows} reports, {len(indices)} terms "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+    return manifest
+
+
+def most_similar(index: SimilarityIndex, row: int, k: int) -> List[Tuple[int, float]]:
+    """Top-k (row, cosine score) neighbours of report `row`, best first."""
+    start, end = index.indptr[row], index.indptr[row + 1]
+    terms, weights = index.indices[start:end], index.data[start:end]
+    if len(terms) > QUERY_TERMS:
+        top = np.argpartition(-weights, QUERY_TERMS)[:QUERY_TERMS]
+        terms, weights = terms[top], weights[top]
+
+    # Concatenate the posting lists of the query terms in one gather
+    starts = index.term_indptr[terms]
+    lengths = index.term_indptr[terms + 1] - starts
+    total = int(lengths.sum())
+    if not total:
+        return []
+    positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+    contributions = index.term_data[positions] * np.repeat(weights, lengths)
+    scores = np.bincount(index.term_rows[positions], weights=contributions, minlength=index.size)
+    scores[row] = 0
+
+    k = min(k, index.size - 1)
+    if k <= 0:
+        return []
+    best = np.argpartition(-scores, k - 1)[:k]
+    best = best[np.argsort(-scores[best])]
+    return [(int(r), float(scores[r])) for r in best if scores[r] > 0]
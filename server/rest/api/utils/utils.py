@@ -5,8 +5,18 @@ from fastapi import APIRouter, HTTPException
 from bs4 import BeautifulSoup, Tag
 import logging
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
-from typing import List, Dict, Any
+from typing import List, Dict, Any, FrozenSet, Iterable, Optional
 import re
+from api.utils.hedging import hedged_get
+from api.utils.extractors import (
+    SUBSTANCE_FIELDS,
+    listing_rows,
+    parse_categories,
+    parse_links_lists,
+    parse_listing,
+    parse_listing_row,
+    parse_substance,
+)
 
 
 # Configure logging
@@ -16,6 +26,30 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def experiences_link(html: str) -> tuple[bool, str]:
+    """
+    Whether a substance info page lists experience reports, and its "MORE" link
+    Returns: (has_experiences: bool, more_url: str)
+    """
+    soup = parse_links_lists(html)
+    for links_list in soup.find_all('div', class_='links-list'):
+        ish_div = links_list.find('div', class_='ish')
+        if ish_div and 'EXPERIENCES' in ish_div.text:
+            experience_links = links_list.find_all('div', class_='link-int')
+
+            if len(experience_links) == 1 and 'Submit' in experience_links[0].text:
+                return False, ""
+
+            more_div = links_list.find('div', class_='more')
+            if more_div and more_div.find('a'):
+                more_url = more_div.find('a').get('href')
+                if more_url:
+                    return True, f"https://www.erowid.org{more_url}"
+            return True, ""
+
+    return False, ""
+
+
 async def check_experience_exists(url: str) -> tuple[bool, str]:
     """
     Check if a substance has experience reports and return the "MORE" link
@@ -26,28 +60,9 @@ async def check_experience_exists(url: str) -> tuple[bool, str]:
             raise ValueError("Invalid Erowid URL")
 
         async with httpx.AsyncClient(verify=False, timeout=30.0) as client:
-            response = await client.get(url)
+            response = await hedged_get(client, url, "substance_info")
             response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            links_lists = soup.find_all('div', class_='links-list')
-            
-            for links_list in links_lists:
-                ish_div = links_list.find('div', class_='ish')
-                if ish_div and 'EXPERIENCES' in ish_div.text:
-                    experience_links = links_list.find_all('div', class_='link-int')
-                    
-                    if len(experience_links) == 1 and 'Submit' in experience_links[0].text:
-                        return False, ""
-                        
-                    more_div = links_list.find('div', class_='more')
-                    if more_div and more_div.find('a'):
-                        more_url = more_div.find('a').get('href')
-                        if more_url:
-                            return True, f"https://www.erowid.org{more_url}"
-                    return True, ""
-            
-            return False, ""
+            return experiences_link(response.text)
 
     except ValueError as e:
         raise HTTPException(
@@ -78,10 +93,10 @@ async def fetch_experience_categories(url: str) -> dict:
     """
     try:
         async with httpx.AsyncClient(verify=False, timeout=30.0) as client:
-            response = await client.get(url)
+            response = await hedged_get(client, url, "categories")
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = parse_categories(response.text)
             categories = {}
             
             category_headers = soup.find_all('td', bgcolor='#002C00')
@@ -132,6 +147,23 @@ async def fetch_experience_categories(url: str) -> dict:
         )
 
 
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[FrozenSet[str]]:
+    """
+    Parse a comma-separated `fields=` query value against the allowed names.
+    Returns None when no selection was made, meaning all fields.
+    """
+    if not fields:
+        return None
+    selected = frozenset(f.strip() for f in fields.split(",") if f.strip())
+    unknown = selected - frozenset(allowed)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}. Allowed: {', '.join(sorted(allowed))}"
+        )
+    return selected or None
+
+
 _log = logging.getLogger("erowid.pagination")
 
 
@@ -143,51 +175,62 @@ def _update_query(url: str, **new_q) -> str:
 
 
 async def _soup(client: httpx.AsyncClient, url: str) -> BeautifulSoup:
-    r = await client.get(url)
+    r = await hedged_get(client, url, "listing")
     r.raise_for_status()
-    return BeautifulSoup(r.text, "html.parser")
+    return parse_listing(r.text)
 
 
 async def fetch_paginated_experiences(
     url: str,
     start: int = 0,
     max: int = 100,
+    fields: Optional[FrozenSet[str]] = None,
+    whole_static: bool = False,
 ) -> Dict[str, Any]:
     """
     Scrape experiences from an Erowid category/search page.
     - exp.cgi pages: honor ?Start & ?Max on the server
     - exp_*.shtml pages: fetch once and slice locally
+    - fields: only read these row fields (default: all)
+    - whole_static: return every row of an exp_*.shtml page instead of a slice
+    An exp.cgi `url` (such as a previous `next_url`) is fetched directly.
     """
     try:
         async with httpx.AsyncClient(verify=False, timeout=30.0) as client:
-            first_soup = await _soup(client, url)
-
-            # ── detect if this is a CGI page (server pagination) ───────────
-            page_link = first_soup.select_one('a[href*="Start="]')
-            is_cgi = bool(page_link and "exp.cgi" in page_link["href"])
-
-            # -----------------------------------------------------------------
-            #   1) Build the page URL to fetch (CGI) or keep static URL (shtml)
-            # -----------------------------------------------------------------
-            if is_cgi:
-                pl_parsed = urlparse(page_link["href"])
-                q = parse_qs(pl_parsed.query)
-                s_id, c_id = q.get("S", [None])[0], q.get("C", [None])[0]
-                base_cgi = f"https://www.erowid.org{pl_parsed.path}"
-                page_url = _update_query(
-                    base_cgi,
-                    S=s_id,
-                    C=c_id,
-                    ShowViews=q.get("ShowViews", ["0"])[0],
-                    Cellar=q.get("Cellar", ["0"])[0],
-                    Start=start,
-                    Max=max,
-                )
+            if "exp.cgi" in urlparse(url).path:
+                # already a server-paginated URL – fetch the page directly
+                is_cgi = True
+                page_url = _update_query(url, Start=start, Max=max)
                 soup = await _soup(client, page_url)
             else:
-                # static .shtml page – single fetch, slice rows locally
-                page_url = url
-                soup = first_soup
+                first_soup = await _soup(client, url)
+
+                # ── detect if this is a CGI page (server pagination) ───────────
+                page_link = first_soup.select_one('a[href*="Start="]')
+                is_cgi = bool(page_link and "exp.cgi" in page_link["href"])
+
+                # -------------------------------------------------------------
+                #   1) Build the page URL to fetch (CGI) or keep static URL (shtml)
+                # -------------------------------------------------------------
+                if is_cgi:
+                    pl_parsed = urlparse(page_link["href"])
+                    q = parse_qs(pl_parsed.query)
+                    s_id, c_id = q.get("S", [None])[0], q.get("C", [None])[0]
+                    base_cgi = f"https://www.erowid.org{pl_parsed.path}"
+                    page_url = _update_query(
+                        base_cgi,
+                        S=s_id,
+                        C=c_id,
+                        ShowViews=q.get("ShowViews", ["0"])[0],
+                        Cellar=q.get("Cellar", ["0"])[0],
+                        Start=start,
+                        Max=max,
+                    )
+                    soup = await _soup(client, page_url)
+                else:
+                    # static .shtml page – single fetch, slice rows locally
+                    page_url = url
+                    soup = first_soup
 
             # -----------------------------------------------------------------
             #   2) Parse rows
@@ -209,38 +252,17 @@ async def fetch_paginated_experiences(
                     },
                 }
 
-            rows = table.select('tr[class^="exp-list-row"]')
-            if not is_cgi:
-                rows = rows[start : start + max]  # local slice for static pages
+            all_rows = listing_rows(table)
+            if is_cgi or whole_static:
+                rows = all_rows
+            else:
+                rows = all_rows[start : start + max]  # local slice for static pages
 
             exps: List[Dict[str, str | None]] = []
             for r in rows:
-                a_tag = r.select_one("td.exp-title a")
-                if not a_tag:
-                    continue
-                raw_href = a_tag["href"].lstrip("/")
-                full_url = (
-                    f"https://www.erowid.org/{raw_href}"
-                    if raw_href.startswith("experiences/")
-                    else f"https://www.erowid.org/experiences/{raw_href}"
-                )
-                author_tag = r.select_one("td.exp-author")
-                substance_tag = r.select_one("td.exp-substance")
-                rating_tag = r.select_one("img[alt]")
-                date_tag = r.select_one("td.exp-pubdate")
-
-                exps.append(
-                    {
-                        "title": a_tag.text.strip(),
-                        "url": full_url,
-                        "author": author_tag.text.strip() if author_tag else None,
-                        "substance": substance_tag.text.strip() if substance_tag else None,
-                        "rating": rating_tag["alt"] if rating_tag else "Unrated",
-                        "date": date_tag.text.strip() if date_tag else None,
-                    }
-                )
-
-                
+                exp = parse_listing_row(r, fields)
+                if exp:
+                    exps.append(exp)
 
             # -----------------------------------------------------------------
             #   3) Pagination metadata
@@ -252,7 +274,7 @@ async def fetch_paginated_experiences(
                 has_next = start + max < total_cnt
                 next_url = _update_query(page_url, Start=start + max, Max=max) if has_next else None
             else:
-                total_cnt = len(table.select('tr[class^="exp-list-row"]'))
+                total_cnt = len(all_rows)
                 total_pages = 1
                 has_next = False
                 next_url = None
@@ -280,69 +302,110 @@ async def fetch_paginated_experiences(
         raise HTTPException(status_code=500, detail=f"Scraper error: {e}")
 
 
-def scrape_erowid_substance(html: str) -> Dict[str, Any]:
-    soup = BeautifulSoup(html, "html.parser")
+async def search_author_experiences(username: str) -> List[Dict[str, str | None]]:
+    """
+    Live Erowid AuthorSearch for a username.
+    This is a slow server-side search; callers should prefer the author index.
+    """
+    url = f"https://www.erowid.org/experiences/exp.cgi?A=Search&AuthorSearch={username}&Exact=1"
+    logger.info(f"Fetching user experiences for username: {username} from {url}")
+
+    try:
+        async with httpx.AsyncClient(verify=False, timeout=30.0) as client:
+            response = await hedged_get(client, url, "author_search")
+            response.raise_for_status()
+            soup = parse_listing(response.text)
+
+            exp_table = soup.find('table', class_='exp-list-table')
+            if not exp_table:
+                logger.warning(f"No experience table found for user: {username}")
+                return []
+
+            experiences = []
+            for row in exp_table.find_all('tr', class_='exp-list-row'):
+                try:
+                    exp = parse_listing_row(row)
+                    if exp:
+                        experiences.append(exp)
+                except Exception as e:
+                    logger.error(f"Error parsing row for user {username}: {str(e)}")
+                    continue
+
+            logger.info(f"Found {len(experiences)} experiences for user: {username}")
+            return experiences
+    except Exception as e:
+        logger.error(f"Error fetching experiences for user {username}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to fetch user experiences: {str(e)}")
+
+
+def scrape_erowid_substance(html: str, fields: FrozenSet[str] = SUBSTANCE_FIELDS) -> Dict[str, Any]:
+    soup = parse_substance(html, fields)
     data = {}
 
-    title_section = soup.select_one(".title-section .ts-substance-name")
-    data["substance_name"] = title_section.get_text(strip=True) if title_section else None
-
-    summary = {}
-    summary_card = soup.select_one(".summary-card-text-surround")
-    if summary_card:
-        def get_div_text(cls):
-            div = summary_card.select_one(f".{cls}")
-            return div.get_text(strip=True) if div else None
-
-        summary["common_names"] = get_div_text("sum-common-name")
-        summary["effects_classification"] = get_div_text("sum-effects")
-        summary["chemical_name"] = get_div_text("sum-chem-name")
-        summary["description"] = get_div_text("sum-description")
-    data["summary"] = summary
-
-    summary_links = []
-    for a in soup.select(".summary-card-icon-surround a"):
-        summary_links.append({
-            "title": a.img["alt"] if a.img and a.img.has_attr("alt") else None,
-            "href": a["href"],
-        })
-    data["summary_links"] = summary_links
-    sections = []
-    for links_list in soup.select(".links-list"):
-        section = {}
-        header = links_list.select_one(".ish")
-        section["section"] = header.get_text(" ", strip=True) if header else None
-        section["links"] = []
-        for link in links_list.select(".link-int a, .link-ext a"):
-            section["links"].append({
-                "title": link.get_text(strip=True),
-                "href": link["href"],
-            })
-        more = links_list.select_one(".more a")
-        if more:
-            section["links"].append({
-                "title": more.get_text(strip=True),
-                "href": more["href"],
-            })
-        if section["links"]:
-            sections.append(section)
-    data["sections"] = sections
-
-
-    offsite_sections = []
-    for links_list in soup.select(".index-links-ext .links-list"):
-        section = {}
-        header = links_list.select_one(".ish")
-        section["section"] = header.get_text(" ", strip=True) if header else None
-        section["links"] = []
-        for link in links_list.select(".link-int a, .link-ext a"):
-            section["links"].append({
-                "title": link.get_text(strip=True),
-                "href": link["href"],
+    if "substance_name" in fields:
+        title_section = soup.select_one(".title-section .ts-substance-name")
+        data["substance_name"] = title_section.get_text(strip=True) if title_section else None
+
+    if "summary" in fields:
+        summary = {}
+        summary_card = soup.select_one(".summary-card-text-surround")
+        if summary_card:
+            def get_div_text(cls):
+                div = summary_card.select_one(f".{cls}")
+                return div.get_text(strip=True) if div else None
+
+            summary["common_names"] = get_div_text("sum-common-name")
+            summary["effects_classification"] = get_div_text("sum-effects")
+            summary["chemical_name"] = get_div_text("sum-chem-name")
+            summary["description"] = get_div_text("sum-description")
+        data["summary"] = summary
+
+    if "summary_links" in fields:
+        summary_links = []
+        for a in soup.select(".summary-card-icon-surround a"):
+            summary_links.append({
+                "title": a.img["alt"] if a.img and a.img.has_attr("alt") else None,
+                "href": a["href"],
             })
-        if section["links"]:
-            offsite_sections.append(section)
-    data["offsite_sections"] = offsite_sections
+        data["summary_links"] = summary_links
+
+    if "sections" in fields:
+        sections = []
+        for links_list in soup.select(".links-list"):
+            section = {}
+            header = links_list.select_one(".ish")
+            section["section"] = header.get_text(" ", strip=True) if header else None
+            section["links"] = []
+            for link in links_list.select(".link-int a, .link-ext a"):
+                section["links"].append({
+                    "title": link.get_text(strip=True),
+                    "href": link["href"],
+                })
+            more = links_list.select_one(".more a")
+            if more:
+                section["links"].append({
+                    "title": more.get_text(strip=True),
+                    "href": more["href"],
+                })
+            if section["links"]:
+                sections.append(section)
+        data["sections"] = sections
+
+    if "offsite_sections" in fields:
+        offsite_sections = []
+        for links_list in soup.select(".index-links-ext .links-list"):
+            section = {}
+            header = links_list.select_one(".ish")
+            section["section"] = header.get_text(" ", strip=True) if header else None
+            section["links"] = []
+            for link in links_list.select(".link-int a, .link-ext a"):
+                section["links"].append({
+                    "title": link.get_text(strip=True),
+                    "href": link["href"],
+                })
+            if section["links"]:
+                offsite_sections.append(section)
+        data["offsite_sections"] = offsite_sections
 
     return data
 
@@ -379,6 +442,9 @@ def absolutize_href(href: str, base_url: str = "", section_name: str = None) ->
 def is_valid_experience_link(href: str) -> bool:
     return bool(re.match(r"^https://www\.erowid\.org/experiences/exp\.php\?ID=\d+$", href))
 
+def is_erowid_experiences_url(url: str) -> bool:
+    return url.startswith("https://www.erowid.org/experiences/")
+
 def clean_links(links, base_url="", section_name=None):
     cleaned = []
     for link in links:
@@ -393,16 +459,18 @@ def clean_links(links, base_url="", section_name=None):
     return cleaned
 
 def clean_data(data: dict, base_url: str = "") -> dict:
-    cleaned_sections = []
-    for section in data.get("sections", []):
-        section_name = clean_section_title(section.get("section"))
-        cleaned_sections.append({
-            "section": section_name,
-            "links": clean_links(section.get("links", []), base_url, section_name),
-        })
-    data["sections"] = cleaned_sections
-
-    data["summary_links"] = clean_links(data.get("summary_links", []), base_url)
+    if "sections" in data:
+        cleaned_sections = []
+        for section in data["sections"]:
+            section_name = clean_section_title(section.get("section"))
+            cleaned_sections.append({
+                "section": section_name,
+                "links": clean_links(section.get("links", []), base_url, section_name),
+            })
+        data["sections"] = cleaned_sections
+
+    if "summary_links" in data:
+        data["summary_links"] = clean_links(data["summary_links"], base_url)
 
     if "offsite_sections" in data:
         cleaned_offsite = []
@@ -0,0 +1,63 @@
+"""
+Compare a full html.parser tree against the parse-only extraction specs.
+
+Usage (from server/rest, with pages saved from Erowid):
+    python -m benchmarks.extractors report exp_1.html exp_2.html
+    python -m benchmarks.extractors listing category.html
+    python -m benchmarks.extractors substance lsd.shtml
+"""
+import argparse
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from api.utils.extractors import extract_report, parse_listing, parse_substance
+
+TARGETS = {
+    "report": extract_report,
+    "listing": parse_listing,
+    "substance": parse_substance,
+}
+
+
+def full_parse(html: str):
+    return BeautifulSoup(html, "html.parser")
+
+
+def measure(fn, html: str, rounds: int) -> tuple[float, float]:
+    """Mean CPU milliseconds per call and peak traced allocation in KiB."""
+    started = time.process_time()
+    for _ in range(rounds):
+        fn(html)
+    cpu_ms = (time.process_time() - started) * 1000 / rounds
+
+    tracemalloc.start()
+    fn(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu_ms, peak / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("page_type", choices=sorted(TARGETS))
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    for path in args.files:
+        with open(path, encoding="cp1252", errors="replace") as f:
+            html = f.read()
+        base_cpu, base_mem = measure(full_parse, html, args.rounds)
+        spec_cpu, spec_mem = measure(TARGETS[args.page_type], html, args.rounds)
+        print(
+            f"{path}: full tree {base_cpu:.2f} ms / {base_mem:.0f} KiB, "
+            f"spec {spec_cpu:.2f} ms / {spec_mem:.0f} KiB "
+            f"({100 * (1 - spec_cpu / base_cpu):.0f}% less CPU, "
+            f"{100 * (1 - spec_mem / base_mem):.0f}% less peak memory)"
+        )
+
+
+if __name__ == "__main__":
+    main()
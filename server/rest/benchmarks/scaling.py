@@ -0,0 +1,147 @@
+"""
+Throughput of `python cli.py serve` as the number of workers grows.
+
+A local upstream serves a saved report page for every URL. For each worker
+count, the benchmark starts the API and sends POST /erowid/experience for
+distinct report URLs on that upstream, so every request is fetched and
+parsed. It uses `Cache-Control: no-cache` and a `fields=` selection, so the
+response cache and the report store never short-circuit the parse. It also
+checks that /metrics counts the requests of every worker.
+
+Usage (from server/rest, with REDIS_URL pointing at a running Redis):
+    python -m benchmarks.scaling exp_1.html --workers 1 2 4 --requests 800
+"""
+import argparse
+import asyncio
+import os
+import re
+import subprocess
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Process
+
+import httpx
+
+FIELDS = "title,author,substance,doses,content,metadata"
+
+
+def serve_upstream(page: bytes, port: int) -> None:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=windows-1252")
+            self.send_header("Content-Length", str(len(page)))
+            self.end_headers()
+            self.wfile.write(page)
+
+        def log_message(self, *args):
+            pass
+
+    ThreadingHTTPServer(("127.0.0.1", port), Handler).serve_forever()
+
+
+async def wait_ready(client: httpx.AsyncClient, base: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get(f"{base}/api/v1/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("API did not start")
+
+
+async def load(client: httpx.AsyncClient, base: str, upstream: str, ids: range, concurrency: int) -> float:
+    """Send one request per id with `concurrency` in flight; returns elapsed seconds."""
+    pending = iter(ids)
+    failures = 0
+
+    async def user():
+        nonlocal failures
+        for exp_id in pending:
+            response = await client.post(
+                f"{base}/api/v1/erowid/experience",
+                params={"fields": FIELDS},
+                json={"url": f"{upstream}/experiences/exp.php?ID={exp_id}"},
+                headers={"Cache-Control": "no-cache"},
+            )
+            failures += response.status_code != 200
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    if failures:
+        raise RuntimeError(f"{failures} requests failed")
+    return elapsed
+
+
+async def counted_requests(client: httpx.AsyncClient, base: str) -> int:
+    text = (await client.get(f"{base}/metrics/")).text
+    pattern = r'^lysergic_http_requests_total\{[^}]*endpoint="/api/v1/erowid/experience"[^}]*\} (\S+)$'
+    return int(sum(float(v) for v in re.findall(pattern, text, re.MULTILINE)))
+
+
+async def run(workers: int, args: argparse.Namespace, first_id: int) -> float:
+    base = f"http://127.0.0.1:{args.port}"
+    upstream = f"http://127.0.0.1:{args.upstream_port}"
+    env = {
+        **os.environ,
+        "ANALYTICS_REFRESH_SECONDS": "0",
+        "SIMILARITY_REFRESH_SECONDS": "0",
+        "ADMISSION_MAX_INFLIGHT": str(max(args.concurrency, workers) * 2),
+    }
+    server = subprocess.Popen(
+        [sys.executable, "cli.py", "serve", "--host", "127.0.0.1", "--port", str(args.port), "--workers", str(workers)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+            await wait_ready(client, base)
+            warmup = range(first_id, first_id + args.concurrency * 2)
+            await load(client, base, upstream, warmup, args.concurrency)
+            measured = range(warmup.stop, warmup.stop + args.requests)
+            elapsed = await load(client, base, upstream, measured, args.concurrency)
+
+            counted = await counted_requests(client, base)
+            expected = len(warmup) + len(measured)
+            if counted != expected:
+                print(f"  /metrics counted {counted} of {expected} requests")
+    finally:
+        server.terminate()
+        server.wait()
+    return args.requests / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("page", help="A saved Erowid report page")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--port", type=int, default=5100)
+    parser.add_argument("--upstream-port", type=int, default=5199)
+    args = parser.parse_args()
+
+    with open(args.page, "rb") as f:
+        upstream = Process(target=serve_upstream, args=(f.read(), args.upstream_port), daemon=True)
+    upstream.start()
+    try:
+        baseline = None
+        for i, workers in enumerate(args.workers):
+            throughput = asyncio.run(run(workers, args, first_id=1_000_000 * (i + 1)))
+            baseline = baseline or throughput / workers
+            speedup = throughput / baseline
+            print(
+                f"{workers:>3} workers: {throughput:8.1f} req/s, "
+                f"{speedup:4.2f}x single-worker, {100 * speedup / workers:3.0f}% scaling efficiency"
+            )
+    finally:
+        upstream.terminate()
+
+
+if __name__ == "__main__":
+    main()
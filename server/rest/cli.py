@@ -0,0 +1,149 @@
+"""
+Command line entry points for offline jobs.
+
+Usage (from server/rest):
+    python cli.py serve --workers 4       # API server, WORKERS from settings by default
+    python cli.py export reports --out reports.jsonl.zst --compression zstd
+    python cli.py export listings --format parquet --out listings.parquet --since-id 100000
+    python cli.py analytics
+    python cli.py similarity
+    python cli.py crawl seed              # queue every substance on Erowid
+    python cli.py crawl work --concurrency 8
+    python cli.py crawl status
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+
+import uvicorn
+from prometheus_client import start_http_server
+
+from api.routes.v1.erowid.substances import get_substances
+from api.utils.analytics import rebuild as rebuild_analytics
+from api.utils.crawler import run_worker
+from api.utils.export import COMPRESSIONS, DATASETS, export_jsonl, export_parquet
+from api.utils.similarity import build_index as build_similarity_index
+from core.config import settings
+from db import crawl_queue
+from db.crawl_queue import CrawlTask
+
+
+def serve(args: argparse.Namespace) -> None:
+    if args.workers > 1 or "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # Workers inherit this before importing prometheus_client; stale files
+        # from a previous run would otherwise be summed into /metrics
+        path = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", settings.PROMETHEUS_MULTIPROC_DIR)
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+    # Workers size their share of the admission limits from this
+    os.environ["WORKERS"] = str(args.workers)
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+
+
+async def export(args: argparse.Namespace) -> None:
+    if args.format == "parquet":
+        rows = await export_parquet(args.dataset, args.out, args.since_id, args.since)
+        print(f"Wrote {rows} {args.dataset} rows to {args.out}")
+        return
+    with open(args.out, "wb") as f:
+        async for data in export_jsonl(args.dataset, args.compression, args.since_id, args.since):
+            f.write(data)
+    print(f"Wrote {args.dataset} to {args.out}")
+
+
+async def analytics(args: argparse.Namespace) -> None:
+    overview = await rebuild_analytics()
+    print(f"Analytics built from {overview['reports']} reports and {overview['doses']} doses")
+
+
+async def similarity(args: argparse.Namespace) -> None:
+    manifest = await build_similarity_index()
+    print(f"Similarity index built over {manifest['reports']} reports")
+
+
+async def crawl_seed(args: argparse.Namespace) -> None:
+    if args.reset:
+        await crawl_queue.reset()
+    urls = args.substance
+    if not urls:
+        substances = await get_substances()
+        urls = [s["info_url"] for category in substances["data"].values() for s in category]
+    added = await crawl_queue.enqueue(CrawlTask("substance", url) for url in urls)
+    print(f"Queued {added} new substances ({len(urls) - added} already seen)")
+
+
+async def crawl_work(args: argparse.Namespace) -> None:
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+    await run_worker(args.concurrency, args.until_empty)
+
+
+async def crawl_status(args: argparse.Namespace) -> None:
+    print(json.dumps(await crawl_queue.status(), indent=2))
+
+
+async def crawl_retry(args: argparse.Namespace) -> None:
+    print(f"Requeued {await crawl_queue.requeue_dead()} dead tasks")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_cmd = commands.add_parser("serve", help="Run the API with one or more uvicorn workers")
+    serve_cmd.add_argument("--host", default="0.0.0.0")
+    serve_cmd.add_argument("--port", type=int, default=5000)
+    serve_cmd.add_argument("--workers", type=int, default=settings.WORKERS)
+    serve_cmd.set_defaults(run=serve)
+
+    export_cmd = commands.add_parser("export", help="Export a locally stored dataset")
+    export_cmd.add_argument("dataset", choices=DATASETS)
+    export_cmd.add_argument("--out", required=True)
+    export_cmd.add_argument("--format", choices=("jsonl", "parquet"), default="jsonl")
+    export_cmd.add_argument("--compression", choices=COMPRESSIONS, default="gzip",
+                            help="JSONL compression (Parquet files are always zstd-compressed)")
+    export_cmd.add_argument("--since-id", type=int, help="Only records with a higher ExpID")
+    export_cmd.add_argument("--since", type=float, help="Only reports stored after this unix timestamp")
+    export_cmd.set_defaults(run=export)
+
+    analytics_cmd = commands.add_parser("analytics", help="Rebuild dose and demographics analytics")
+    analytics_cmd.set_defaults(run=analytics)
+
+    similarity_cmd = commands.add_parser("similarity", help="Rebuild the similar-experience index")
+    similarity_cmd.set_defaults(run=similarity)
+
+    crawl_cmd = commands.add_parser("crawl", help="Distributed Erowid crawl")
+    crawl_commands = crawl_cmd.add_subparsers(dest="crawl_command", required=True)
+    seed_cmd = crawl_commands.add_parser("seed", help="Queue substances to crawl")
+    seed_cmd.add_argument("--substance", action="append", default=[],
+                          help="Substance info URL (repeatable); default is every substance on Erowid")
+    seed_cmd.add_argument("--reset", action="store_true",
+                          help="Forget previous crawl state first so everything is visited again")
+    seed_cmd.set_defaults(run=crawl_seed)
+    work_cmd = crawl_commands.add_parser("work", help="Run a crawl worker")
+    work_cmd.add_argument("--concurrency", type=int, default=settings.CRAWL_CONCURRENCY)
+    work_cmd.add_argument("--until-empty", action="store_true", help="Exit once nothing is queued or leased")
+    work_cmd.add_argument("--metrics-port", type=int, default=settings.CRAWL_METRICS_PORT,
+                          help="Port for Prometheus metrics, 0 to disable")
+    work_cmd.set_defaults(run=crawl_work)
+    status_cmd = crawl_commands.add_parser("status", help="Show queue depth and progress")
+    status_cmd.set_defaults(run=crawl_status)
+    retry_cmd = crawl_commands.add_parser("retry-dead", help="Requeue tasks that ran out of attempts")
+    retry_cmd.set_defaults(run=crawl_retry)
+
+    args = parser.parse_args()
+    try:
+        result = args.run(args)
+        if asyncio.iscoroutine(result):
+            asyncio.run(result)
+    except ValueError as e:
+        sys.exit(str(e))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Admission control for upstream-bound requests.
+
+This middleware sits inside the response cache, so anything answerable from
+cache is returned before it gets here and is always admitted. Misses may run
+ADMISSION_MAX_INFLIGHT at a time, with up to ADMISSION_MAX_QUEUE more waiting
+ADMISSION_QUEUE_TIMEOUT_SECONDS for a slot. Everything beyond that is shed
+immediately with a 503 and `Retry-After`. Endpoints served purely from
+local data are exempt.
+"""
+import asyncio
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from prometheus_client import Counter, Gauge
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import Response
+
+admission_inflight = Gauge(
+    "lysergic_admission_inflight",
+    "Admitted upstream-bound requests currently running",
+    multiprocess_mode="livesum"
+)
+admission_queue_depth = Gauge(
+    "lysergic_admission_queue_depth",
+    "Upstream-bound requests waiting for an admission slot",
+    multiprocess_mode="livesum"
+)
+admission_shed = Counter(
+    "lysergic_admission_shed_total",
+    "Requests rejected by admission control",
+    ["reason"]
+)
+
+
+class AdmissionControlMiddleware(BaseHTTPMiddleware):
+    def __init__(
+            self,
+            app,
+            guarded_prefix: str,
+            exempt_prefixes: list[str],
+            max_inflight: int,
+            max_queue: int,
+            queue_timeout: float,
+            retry_after: int,
+    ):
+        super().__init__(app)
+        self.guarded_prefix = guarded_prefix
+        self.exempt_prefixes = tuple(exempt_prefixes)
+        self.slots = asyncio.Semaphore(max_inflight)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.waiting = 0
+
+    def _shed(self, reason: str) -> Response:
+        admission_shed.labels(reason=reason).inc()
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Server is busy fetching from Erowid, please retry shortly"},
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+    async def dispatch(self, request: Request, call_next) -> Response:
+        path = request.url.path
+        if not path.startswith(self.guarded_prefix) or path.startswith(self.exempt_prefixes):
+            return await call_next(request)
+
+        if self.slots.locked():
+            if self.waiting >= self.max_queue:
+                return self._shed("queue_full")
+            self.waiting += 1
+            admission_queue_depth.inc()
+            try:
+                await asyncio.wait_for(self.slots.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                return self._shed("queue_timeout")
+            finally:
+                self.waiting -= 1
+                admission_queue_depth.dec()
+        else:
+            await self.slots.acquire()
+
+        admission_inflight.inc()
+        try:
+            return await call_next(request)
+        finally:
+            admission_inflight.dec()
+            self.slots.release()
@@ -0,0 +1,183 @@
+"""
+First-party Redis cache: a JSON backend on the shared redis.asyncio pool and
+the response cache middleware built on it.
+
+Responses are stored as JSON envelopes that outlive their per-endpoint TTL
+(CACHE_TTLS) by CACHE_STALE_GRACE_SECONDS. When the handler fails with a 5xx,
+a stale envelope for the same key is served instead, marked with
+`X-Cache: STALE` and a `Warning` header. 400/404 answers are cached for
+NEGATIVE_CACHE_TTL_SECONDS so invalid URLs stop reaching Erowid.
+"""
+import hashlib
+import json
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode
+
+from fastapi import Request
+from prometheus_client import Counter, Histogram
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import Response
+
+from api.utils.utils import logger
+from core.config import settings
+from db.session import redis
+
+NEGATIVE_STATUSES = (400, 404)
+
+cache_lookups = Counter(
+    "lysergic_cache_lookups_total",
+    "Response cache lookups by outcome",
+    ["result"]
+)
+cache_backend_duration = Histogram(
+    "lysergic_cache_backend_duration_seconds",
+    "Redis cache backend operation latency",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+
+class RedisCacheBackend:
+    """
+    JSON key/value cache on redis.asyncio.
+    Redis failures are logged and treated as misses so the cache never takes
+    a request down with it.
+    """
+
+    def __init__(self, client: Redis, prefix: str = "lysergic:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Any]:
+        return (await self.get_many([key]))[0]
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        if not keys:
+            return []
+        try:
+            with cache_backend_duration.labels(operation="mget").time():
+                raw = await self.client.mget([self.prefix + k for k in keys])
+        except RedisError as e:
+            logger.warning(f"Cache read failed for {len(keys)} keys: {e}")
+            return [None] * len(keys)
+        return [json.loads(v) if v else None for v in raw]
+
+    async def set(self, key: str, value: Any, ttl: int) -> None:
+        await self.set_many({key: value}, ttl)
+
+    async def set_many(self, items: Dict[str, Any], ttl: int) -> None:
+        if not items:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for key, value in items.items():
+            pipe.set(self.prefix + key, json.dumps(value), ex=ttl)
+        try:
+            with cache_backend_duration.labels(operation="mset").time():
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Cache write failed for {len(items)} keys: {e}")
+
+    async def add(self, key: str, value: Any, ttl: int) -> bool:
+        """Set `key` only if it is absent. False if it exists or Redis is unavailable."""
+        try:
+            with cache_backend_duration.labels(operation="add").time():
+                return bool(await self.client.set(self.prefix + key, json.dumps(value), ex=ttl, nx=True))
+        except RedisError as e:
+            logger.warning(f"Cache add failed for {key}: {e}")
+            return False
+
+
+cache_backend = RedisCacheBackend(redis)
+
+
+def canonical_query(query: str) -> str:
+    """
+    Order-insensitive form of a query string. `fields=` selections are
+    deduplicated and sorted so equivalent partial responses share an entry,
+    while different selections, and the full response, never do.
+    """
+    params = []
+    for name, value in parse_qsl(query, keep_blank_values=True):
+        if name == "fields":
+            value = ",".join(sorted({f.strip() for f in value.split(",") if f.strip()}))
+        params.append((name, value))
+    return urlencode(sorted(params))
+
+
+async def _body_hash(request: Request) -> str:
+    body = await request.body() if request.method == "POST" else b""
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True).encode()
+    except ValueError:
+        pass
+    return hashlib.sha256(body).hexdigest()
+
+
+class ResponseCacheMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app, backend: RedisCacheBackend, ttls: Dict[str, int]):
+        super().__init__(app)
+        self.backend = backend
+        # Longest prefix first so /erowid/experiences/... wins over /erowid/experience
+        self.ttls = sorted(ttls.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def ttl_for(self, path: str) -> Optional[int]:
+        for prefix, ttl in self.ttls:
+            if path.startswith(prefix):
+                return ttl
+        return None
+
+    async def cache_key(self, request: Request) -> str:
+        auth = request.headers.get('Authorization', "token public")
+        token = auth.split(" ")[-1]
+        query = canonical_query(request.url.query)
+        return f"cache:{request.url.path}?{query}:{token}:{await _body_hash(request)}"
+
+    def _respond(self, entry: Dict[str, Any], state: str) -> Response:
+        remaining = max(int(entry["fresh_until"] - time.time()), 0)
+        headers = {"Cache-Control": f"max-age={remaining}", "X-Cache": state}
+        if state == "STALE":
+            headers["Warning"] = '110 - "Response is Stale"'
+        cache_lookups.labels(result=state.lower()).inc()
+        return Response(entry["body"], status_code=entry["status"], media_type="application/json", headers=headers)
+
+    async def _store(self, key: str, status: int, body: bytes, ttl: int, grace: int) -> None:
+        envelope = {"status": status, "body": body.decode(), "fresh_until": time.time() + ttl}
+        await self.backend.set(key, envelope, ttl + grace)
+
+    async def dispatch(self, request: Request, call_next) -> Response:
+        cache_control = request.headers.get('Cache-Control', '')
+        ttl = self.ttl_for(request.url.path)
+        if ttl is None or request.method not in ['GET', 'POST'] or cache_control == 'no-cache':
+            return await call_next(request)
+
+        key = await self.cache_key(request)
+        entry = await self.backend.get(key)
+        if entry and entry["fresh_until"] >= time.time():
+            return self._respond(entry, "NEGATIVE" if entry["status"] in NEGATIVE_STATUSES else "HIT")
+        stale = entry if entry and entry["status"] == 200 else None
+
+        try:
+            response: Response = await call_next(request)
+        except Exception:
+            if stale:
+                logger.warning(f"Serving stale {request.url.path} after handler error")
+                return self._respond(stale, "STALE")
+            raise
+
+        if response.status_code >= 500 and stale:
+            logger.warning(f"Serving stale {request.url.path} after upstream {response.status_code}")
+            return self._respond(stale, "STALE")
+
+        cache_lookups.labels(result="miss").inc()
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        if cache_control != 'no-store':
+            if response.status_code == 200:
+                await self._store(key, 200, body, ttl, settings.CACHE_STALE_GRACE_SECONDS)
+            elif response.status_code in NEGATIVE_STATUSES:
+                await self._store(key, response.status_code, body, settings.NEGATIVE_CACHE_TTL_SECONDS, 0)
+
+        headers = {**response.headers, "X-Cache": "MISS"}
+        return Response(body, status_code=response.status_code, headers=headers)
@@ -6,7 +6,68 @@ class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     PROJECT_NAME: str = "Lysergic"
 
+    # `python cli.py serve`: uvicorn worker processes. With more than one,
+    # /metrics aggregates every worker through PROMETHEUS_MULTIPROC_DIR
+    WORKERS: int = 1
+    PROMETHEUS_MULTIPROC_DIR: str = "/tmp/lysergic-metrics"
+    # How often each worker checks whether a background job is due (core/jobs.py)
+    JOB_POLL_SECONDS: int = 60
+
     REDIS_URL: str  # ✅ Add this line
+    REDIS_MAX_CONNECTIONS: int = 50
+    # How long a caller waits for a free pooled connection before giving up
+    REDIS_POOL_TIMEOUT_SECONDS: float = 0.5
+
+    # Substance -> experiences URL -> categories graph (db/substance_graph.py)
+    GRAPH_TTL_SECONDS: int = 30 * 24 * 3600
+    GRAPH_REFRESH_AFTER_SECONDS: int = 24 * 3600
+    GRAPH_NEGATIVE_TTL_SECONDS: int = 3600
+
+    # Hedged upstream GETs (api/utils/hedging.py), off unless enabled
+    HEDGING_ENABLED: bool = False
+    HEDGE_MAX_RATIO: float = 0.05
+    HEDGE_MIN_SAMPLES: int = 20
+    HEDGE_WINDOW_SIZE: int = 200
+
+    # Response cache (core/cache.py), TTL in seconds per path under API_V1_STR
+    CACHE_TTLS: dict[str, int] = {
+        "/erowid/experiences/categories": 6 * 3600,
+        "/erowid/experience": 24 * 3600,
+        "/erowid/experience/similar": 3600,
+        "/erowid/user": 3600,
+        "/erowid/substances": 24 * 3600,
+        "/erowid/information": 24 * 3600,
+    }
+    CACHE_STALE_GRACE_SECONDS: int = 24 * 3600
+    NEGATIVE_CACHE_TTL_SECONDS: int = 300
+
+    # Admission control for cache misses (core/admission.py), for the whole
+    # server: each of the WORKERS processes gets an equal share
+    ADMISSION_MAX_INFLIGHT: int = 64
+    ADMISSION_MAX_QUEUE: int = 128
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 2.0
+    ADMISSION_RETRY_AFTER_SECONDS: int = 5
+
+    # Dose and demographics analytics (api/utils/analytics.py), rebuilt in
+    # the background every ANALYTICS_REFRESH_SECONDS; 0 leaves it to the CLI
+    ANALYTICS_COLUMNS_PATH: str = "data/analytics/columns.npz"
+    ANALYTICS_REFRESH_SECONDS: int = 6 * 3600
+
+    # "More like this" index (api/utils/similarity.py), rebuilt like analytics
+    SIMILARITY_INDEX_PATH: str = "data/similarity"
+    SIMILARITY_REFRESH_SECONDS: int = 24 * 3600
+    SIMILARITY_TERMS_PER_REPORT: int = 64
+    SIMILARITY_MAX_DF: float = 0.3
+
+    # Distributed crawl queue (db/crawl_queue.py) and workers (api/utils/crawler.py)
+    CRAWL_RATE_PER_SECOND: int = 2  # upstream requests/s shared by all workers
+    CRAWL_CONCURRENCY: int = 4  # tasks in flight per worker process
+    CRAWL_LEASE_SECONDS: int = 300
+    CRAWL_MAX_ATTEMPTS: int = 5
+    CRAWL_RETRY_BASE_SECONDS: int = 30
+    CRAWL_PAGE_SIZE: int = 100
+    CRAWL_IDLE_SECONDS: float = 5.0
+    CRAWL_METRICS_PORT: int = 9100
 
     BACKEND_CORS_ORIGINS: list[str] = [
         "http://localhost:3000",
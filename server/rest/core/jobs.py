@@ -0,0 +1,57 @@
+"""
+Periodic background jobs started with the application.
+
+Every worker process (and every replica) starts the same jobs. Each round
+is claimed through a Redis key set with NX and expiring after the job's
+interval, so a job runs once per interval across the deployment, whichever
+worker gets there first. Jobs that write files to local disk, like the
+similarity index, are claimed per host instead: the workers of one container
+share a round, and each replica builds its own copy. Workers poll at most
+every JOB_POLL_SECONDS, so if the worker that last ran a job goes away,
+another takes it over soon after its key expires.
+"""
+import asyncio
+import os
+import socket
+from typing import Awaitable, Callable
+
+from redis.exceptions import RedisError
+
+from api.utils.utils import logger
+from core.config import settings
+from db.session import redis
+
+JOB_KEY = "lysergic:job:{}"
+
+
+async def claim_round(name: str, interval: float, per_host: bool = False) -> bool:
+    """True if this process should run `name` now."""
+    host = socket.gethostname()
+    key = JOB_KEY.format(f"{name}:{host}" if per_host else name)
+    try:
+        return bool(await redis.set(key, f"{host}:{os.getpid()}", nx=True, ex=max(int(interval), 1)))
+    except RedisError as e:
+        logger.warning(f"Could not claim background job '{name}': {e}")
+        return False
+
+
+async def run_periodically(
+    name: str,
+    interval: float,
+    job: Callable[[], Awaitable[object]],
+    per_host: bool = False,
+) -> None:
+    """
+    Run `job` once every `interval` seconds across all workers (or, with
+    `per_host`, on every host) until cancelled, logging failures.
+    """
+    poll = min(interval, settings.JOB_POLL_SECONDS)
+    while True:
+        try:
+            if await claim_round(name, interval, per_host):
+                await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Background job '{name}' failed: {e}")
+        await asyncio.sleep(poll)
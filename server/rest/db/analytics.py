@@ -0,0 +1,48 @@
+"""
+Storage for the analytics pipeline (api/utils/analytics.py).
+
+The normalized columns are written to ANALYTICS_COLUMNS_PATH as a NumPy
+.npz file for offline analysis. The precomputed results live in one Redis
+hash, keyed by substance, and the overview is stored under "".
+A rebuild writes a new hash and renames it over the old one, so readers never
+see a half-written set.
+"""
+import json
+import os
+from typing import Any, Dict, Optional
+
+import numpy as np
+from redis.exceptions import RedisError
+
+from api.utils.utils import logger
+from core.config import settings
+from db.session import redis
+
+ANALYTICS_KEY = "lysergic:analytics"
+
+
+def save_columns(columns: Dict[str, np.ndarray]) -> None:
+    path = settings.ANALYTICS_COLUMNS_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    partial = f"{path}.partial.npz"
+    np.savez_compressed(partial, **columns)
+    os.replace(partial, path)
+
+
+async def save_results(results: Dict[str, Dict[str, Any]]) -> None:
+    staging = f"{ANALYTICS_KEY}:building"
+    pipe = redis.pipeline(transaction=True)
+    pipe.delete(staging)
+    pipe.hset(staging, mapping={name: json.dumps(result) for name, result in results.items()})
+    pipe.rename(staging, ANALYTICS_KEY)
+    await pipe.execute()
+
+
+async def load_result(substance: str = "") -> Optional[Dict[str, Any]]:
+    """Precomputed analytics for one normalized substance name, or the overview."""
+    try:
+        raw = await redis.hget(ANALYTICS_KEY, substance)
+    except RedisError as e:
+        logger.warning(f"Analytics lookup failed for '{substance}': {e}")
+        return None
+    return json.loads(raw) if raw else None
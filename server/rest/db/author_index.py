@@ -0,0 +1,102 @@
+"""
+Author -> experiences index built from scraped listing rows.
+
+Every exp-list row we parse carries its author, so rows are recorded here as
+they pass through the listing endpoints. Rows seen in passing are never a
+complete list of an author's reports. An author is only served from the index
+after a live AuthorSearch has indexed all of their rows, which the `searched`
+marker records. Until then, and after the marker expires,
+`/erowid/user/{username}` falls back to AuthorSearch.
+"""
+import json
+import math
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from redis.exceptions import RedisError
+
+from api.utils.utils import logger
+from db.session import redis
+
+AUTHOR_KEY = "lysergic:author:{}"
+SEARCHED_KEY = "lysergic:author-searched:{}"
+LISTING_KEY = "lysergic:listing"
+
+# How long a live AuthorSearch keeps an author's indexed rows authoritative
+SEARCHED_TTL_SECONDS = 24 * 3600
+
+
+def normalize_author(name: str) -> str:
+    return " ".join(name.split()).lower()
+
+
+def experience_id(url: str) -> Optional[int]:
+    ids = parse_qs(urlparse(url).query).get("ID")
+    return int(ids[0]) if ids and ids[0].isdigit() else None
+
+
+async def index_listing(rows: Iterable[Dict[str, Any]]) -> None:
+    """Record listing rows under their author, newest ExpID first."""
+    pipe = redis.pipeline(transaction=False)
+    for row in rows:
+        exp_id = experience_id(row.get("url") or "")
+        if not row.get("author") or exp_id is None:
+            continue
+        pipe.hset(LISTING_KEY, str(exp_id), json.dumps(row))
+        pipe.zadd(AUTHOR_KEY.format(normalize_author(row["author"])), {str(exp_id): exp_id})
+    if not len(pipe):
+        return
+    try:
+        await pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Failed to index listing rows: {e}")
+
+
+async def mark_searched(username: str) -> None:
+    try:
+        await redis.set(SEARCHED_KEY.format(normalize_author(username)), 1, ex=SEARCHED_TTL_SECONDS)
+    except RedisError as e:
+        logger.warning(f"Failed to mark author {username} as searched: {e}")
+
+
+async def author_pages(usernames: List[str], start: int, max: int) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Look up a page of experiences for each username in two round trips.
+    Returns None for authors without a recent live search, whose indexed rows
+    may be incomplete.
+    """
+    names = [normalize_author(u) for u in usernames]
+    try:
+        pipe = redis.pipeline(transaction=False)
+        for name in names:
+            pipe.exists(SEARCHED_KEY.format(name))
+            pipe.zcard(AUTHOR_KEY.format(name))
+            pipe.zrevrange(AUTHOR_KEY.format(name), start, start + max - 1)
+        replies = await pipe.execute()
+
+        ids = [exp_id for i in range(len(names)) for exp_id in replies[3 * i + 2]]
+        rows = dict(zip(ids, await redis.hmget(LISTING_KEY, ids))) if ids else {}
+    except RedisError as e:
+        logger.warning(f"Author index lookup failed: {e}")
+        return {u: None for u in usernames}
+
+    pages: Dict[str, Optional[Dict[str, Any]]] = {}
+    for i, username in enumerate(usernames):
+        searched, total, page_ids = replies[3 * i : 3 * i + 3]
+        if not searched:
+            pages[username] = None
+            continue
+        experiences = [json.loads(rows[exp_id]) for exp_id in page_ids if rows.get(exp_id)]
+        pages[username] = {"experiences": experiences, "pagination": paginate(total, start, max)}
+    return pages
+
+
+def paginate(total: int, start: int, max: int) -> Dict[str, Any]:
+    return {
+        "current_page": start // max + 1,
+        "total_pages": math.ceil(total / max),
+        "has_next": start + max < total,
+        "experiences_per_page": max,
+        "total_experiences": total,
+        "current_start": start,
+    }
@@ -0,0 +1,115 @@
+"""
+Chunked readers over everything stored locally: the substance list, listing
+rows from the author index and full reports from the report store. The
+substance list and scraped substance information pages are recorded here.
+
+Each reader is an async generator of record lists, at most `chunk` long, so
+exports and offline jobs run in bounded memory whatever the corpus size.
+"""
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from redis.exceptions import RedisError
+
+from api.utils.utils import logger
+from db.author_index import LISTING_KEY
+from db.report_store import REPORT_KEY, REPORTS_KEY
+from db.session import redis
+
+SUBSTANCES_KEY = "lysergic:substances"
+SUBSTANCE_INFO_KEY = "lysergic:substance_info"
+
+Chunk = List[Dict[str, Any]]
+
+
+async def save_substances(categories: Dict[str, List[Dict[str, Any]]]) -> None:
+    """Record the substance list from /erowid/substances, keyed by info URL."""
+    mapping = {
+        substance["info_url"]: json.dumps(substance)
+        for substances in categories.values()
+        for substance in substances
+        if substance.get("info_url")
+    }
+    if not mapping:
+        return
+    try:
+        await redis.hset(SUBSTANCES_KEY, mapping=mapping)
+    except RedisError as e:
+        logger.warning(f"Failed to store substance list: {e}")
+
+
+async def save_substance_info(url: str, info: Dict[str, Any]) -> None:
+    """Record a scraped substance information page, keyed by its URL."""
+    try:
+        await redis.hset(SUBSTANCE_INFO_KEY, url, json.dumps(info))
+    except RedisError as e:
+        logger.warning(f"Failed to store substance info for {url}: {e}")
+
+
+async def load_substance_info(url: str) -> Optional[Dict[str, Any]]:
+    """The stored substance information page for `url`, or None."""
+    try:
+        raw = await redis.hget(SUBSTANCE_INFO_KEY, url)
+    except RedisError as e:
+        logger.warning(f"Failed to read substance info for {url}: {e}")
+        return None
+    return json.loads(raw) if raw else None
+
+
+async def _scan_hash(key: str, chunk: int) -> AsyncIterator[Dict[str, str]]:
+    cursor = 0
+    while True:
+        cursor, items = await redis.hscan(key, cursor, count=chunk)
+        if items:
+            yield items
+        if cursor == 0:
+            return
+
+
+async def iter_substances(chunk: int = 500) -> AsyncIterator[Chunk]:
+    async for items in _scan_hash(SUBSTANCES_KEY, chunk):
+        yield [json.loads(raw) for raw in items.values()]
+
+
+async def iter_listings(chunk: int = 500, since_id: Optional[int] = None) -> AsyncIterator[Chunk]:
+    """Listing rows, optionally only those with ExpID above `since_id`."""
+    async for items in _scan_hash(LISTING_KEY, chunk):
+        rows = [
+            {"exp_id": int(exp_id), **json.loads(raw)}
+            for exp_id, raw in items.items()
+            if since_id is None or int(exp_id) > since_id
+        ]
+        if rows:
+            yield rows
+
+
+async def iter_reports(
+    chunk: int = 200,
+    since_id: Optional[int] = None,
+    since: Optional[float] = None,
+) -> AsyncIterator[Chunk]:
+    """
+    Stored reports in store order, optionally only those with ExpID above
+    `since_id` and/or stored after the unix timestamp `since`.
+    """
+    start = 0
+    low = f"({since}" if since is not None else "-inf"
+    while True:
+        members = await redis.zrangebyscore(REPORTS_KEY, low, "+inf", start=start, num=chunk, withscores=True)
+        if not members:
+            return
+        start += len(members)
+        members = [(exp_id, stored_at) for exp_id, stored_at in members
+                   if since_id is None or int(exp_id) > since_id]
+        if not members:
+            continue
+        raws = await redis.mget([REPORT_KEY.format(exp_id) for exp_id, _ in members])
+        reports = []
+        for (exp_id, stored_at), raw in zip(members, raws):
+            if not raw:
+                continue
+            report = json.loads(raw)
+            report.pop("paragraph_offsets", None)
+            reports.append({"exp_id": int(exp_id), **report, "stored_at": stored_at})
+        if reports:
+            yield reports
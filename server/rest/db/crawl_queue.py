@@ -0,0 +1,188 @@
+"""
+Redis-backed crawl work queue shared by every crawler process.
+
+Every task has an id ("kind:start:url"), and that id goes into the `seen`
+set once, so the same page is never queued twice in one crawl. Queued ids
+sit in a sorted set scored by the time they become ready. Claiming moves an
+id atomically into the `leases` sorted set, scored by lease expiry. A worker
+that dies mid-task loses its lease, and the id is put back on the next
+claim. Failed tasks are retried with exponential backoff until
+CRAWL_MAX_ATTEMPTS, then parked in `dead` together with their last error.
+
+The queue lives entirely in Redis, so stopping or losing any worker leaves
+the crawl resumable from where it was. With AOF enabled, the same holds for
+Redis itself.
+"""
+import asyncio
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional
+
+from core.config import settings
+from db.session import redis
+
+PREFIX = "lysergic:crawl:"
+QUEUE_KEY = PREFIX + "queue"
+LEASES_KEY = PREFIX + "leases"
+SEEN_KEY = PREFIX + "seen"
+TASKS_KEY = PREFIX + "tasks"
+ATTEMPTS_KEY = PREFIX + "attempts"
+DEAD_KEY = PREFIX + "dead"
+STATS_KEY = PREFIX + "stats"
+RATE_KEY = PREFIX + "rate:{}"
+
+# Queue each id only once per crawl, payload and schedule together
+_ENQUEUE = redis.register_script("""
+local added = 0
+for i = 1, #ARGV, 2 do
+    local id = cjson.decode(ARGV[i + 1])["id"]
+    if redis.call("SADD", KEYS[1], id) == 1 then
+        redis.call("HSET", KEYS[2], id, ARGV[i + 1])
+        redis.call("ZADD", KEYS[3], ARGV[i], id)
+        added = added + 1
+    end
+end
+return added
+""")
+
+# Requeue expired leases, then lease the first ready task and count the attempt.
+# An id without a payload was completed by a worker whose lease had already
+# expired: drop it instead of leasing it again.
+_CLAIM = redis.register_script("""
+local expired = redis.call("ZRANGEBYSCORE", KEYS[2], "-inf", ARGV[1], "LIMIT", 0, 100)
+for _, id in ipairs(expired) do
+    redis.call("ZREM", KEYS[2], id)
+    redis.call("ZADD", KEYS[1], ARGV[1], id)
+end
+local ready = redis.call("ZRANGEBYSCORE", KEYS[1], "-inf", ARGV[1], "LIMIT", 0, 100)
+for _, id in ipairs(ready) do
+    redis.call("ZREM", KEYS[1], id)
+    local payload = redis.call("HGET", KEYS[3], id)
+    if payload then
+        redis.call("ZADD", KEYS[2], ARGV[2], id)
+        return {payload, redis.call("HINCRBY", KEYS[4], id, 1)}
+    end
+    redis.call("HDEL", KEYS[4], id)
+end
+return false
+""")
+
+
+@dataclass
+class CrawlTask:
+    kind: str  # "substance", "listing" or "report"
+    url: str
+    start: int = 0
+    attempts: int = 0
+
+    @property
+    def id(self) -> str:
+        return f"{self.kind}:{self.start}:{self.url}"
+
+    def payload(self) -> str:
+        return json.dumps({"id": self.id, "kind": self.kind, "url": self.url, "start": self.start})
+
+
+async def enqueue(tasks: Iterable[CrawlTask], delay: float = 0) -> int:
+    """Queue tasks not seen before in this crawl. Returns how many were new."""
+    args = []
+    ready_at = time.time() + delay
+    for task in tasks:
+        args += [ready_at, task.payload()]
+    if not args:
+        return 0
+    return await _ENQUEUE(keys=[SEEN_KEY, TASKS_KEY, QUEUE_KEY], args=args)
+
+
+async def claim() -> Optional[CrawlTask]:
+    now = time.time()
+    claimed = await _CLAIM(
+        keys=[QUEUE_KEY, LEASES_KEY, TASKS_KEY, ATTEMPTS_KEY],
+        args=[now, now + settings.CRAWL_LEASE_SECONDS],
+    )
+    if not claimed:
+        return None
+    payload, attempts = claimed
+    data = json.loads(payload)
+    return CrawlTask(kind=data["kind"], url=data["url"], start=data["start"], attempts=int(attempts))
+
+
+async def complete(task: CrawlTask) -> None:
+    pipe = redis.pipeline(transaction=True)
+    pipe.zrem(LEASES_KEY, task.id)
+    pipe.hdel(TASKS_KEY, task.id)
+    pipe.hdel(ATTEMPTS_KEY, task.id)
+    pipe.hincrby(STATS_KEY, f"{task.kind}:done", 1)
+    await pipe.execute()
+
+
+async def fail(task: CrawlTask, error: str) -> bool:
+    """Schedule a retry with backoff, or park the task as dead. Returns True if it will be retried."""
+    retry = task.attempts < settings.CRAWL_MAX_ATTEMPTS
+    pipe = redis.pipeline(transaction=True)
+    pipe.zrem(LEASES_KEY, task.id)
+    if retry:
+        backoff = settings.CRAWL_RETRY_BASE_SECONDS * 2 ** (task.attempts - 1)
+        pipe.zadd(QUEUE_KEY, {task.id: time.time() + backoff})
+        pipe.hincrby(STATS_KEY, f"{task.kind}:retried", 1)
+    else:
+        pipe.hset(DEAD_KEY, task.id, json.dumps({"error": error, "attempts": task.attempts, "at": time.time()}))
+        pipe.hincrby(STATS_KEY, f"{task.kind}:dead", 1)
+    await pipe.execute()
+    return retry
+
+
+async def requeue_dead() -> int:
+    """Give every dead task a fresh set of attempts."""
+    dead = await redis.hkeys(DEAD_KEY)
+    if not dead:
+        return 0
+    now = time.time()
+    pipe = redis.pipeline(transaction=True)
+    pipe.zadd(QUEUE_KEY, {task_id: now for task_id in dead})
+    pipe.hdel(ATTEMPTS_KEY, *dead)
+    pipe.delete(DEAD_KEY)
+    await pipe.execute()
+    return len(dead)
+
+
+async def reset() -> None:
+    """Forget all crawl state (queue, leases, dedup set, stats). Crawled data is kept."""
+    await redis.delete(QUEUE_KEY, LEASES_KEY, SEEN_KEY, TASKS_KEY, ATTEMPTS_KEY, DEAD_KEY, STATS_KEY)
+
+
+async def status() -> Dict[str, Any]:
+    pipe = redis.pipeline(transaction=False)
+    pipe.zcard(QUEUE_KEY)
+    pipe.zcard(LEASES_KEY)
+    pipe.hlen(DEAD_KEY)
+    pipe.scard(SEEN_KEY)
+    pipe.hgetall(STATS_KEY)
+    queued, leased, dead, seen, stats = await pipe.execute()
+    return {
+        "queued": queued,
+        "leased": leased,
+        "dead": dead,
+        "seen": seen,
+        "stats": {name: int(count) for name, count in sorted(stats.items())},
+    }
+
+
+async def politeness_wait(cost: int = 1) -> None:
+    """
+    Wait until `cost` upstream requests fit in the CRAWL_RATE_PER_SECOND
+    budget shared by all workers, counted in one-second Redis windows.
+    """
+    while True:
+        now = time.time()
+        window = int(now)
+        key = RATE_KEY.format(window)
+        pipe = redis.pipeline(transaction=True)
+        pipe.incrby(key, cost)
+        pipe.expire(key, 2)
+        used, _ = await pipe.execute()
+        if used <= settings.CRAWL_RATE_PER_SECOND or used == cost:
+            return
+        # Window is spent: try the next one
+        await asyncio.sleep(window + 1 - now)
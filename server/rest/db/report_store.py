@@ -0,0 +1,109 @@
+"""
+Durable store of extracted experience reports.
+
+Each report is kept once, in full, together with a paragraph offset index
+over its content, so `/erowid/experience` can serve paragraph ranges and
+summaries without refetching or resending the whole text. The
+`lysergic:reports` sorted set tracks every stored ExpID by store time.
+
+Reports are keyed by ExpID alone, so only canonical Erowid report URLs are
+read from or written to the store; a page fetched from anywhere else is never
+kept under a real report's ID.
+"""
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from redis.exceptions import RedisError
+
+from api.utils.utils import is_valid_experience_link, logger
+from db.author_index import experience_id
+from db.session import redis
+
+REPORT_KEY = "lysergic:report:{}"
+REPORTS_KEY = "lysergic:reports"
+
+EXCERPT_CHARS = 280
+
+
+def paragraph_offsets(content: Optional[str]) -> List[List[int]]:
+    """
+    [start, end) character offsets of each paragraph of the report text.
+    `report_text` separates paragraphs with a blank line and never puts one
+    inside a paragraph.
+    """
+    offsets = []
+    position = 0
+    for block in (content or "").split("\n\n"):
+        if block.strip():
+            offsets.append([position, position + len(block)])
+        position += len(block) + 2
+    return offsets
+
+
+def _stored_id(url: str) -> Optional[int]:
+    return experience_id(url) if is_valid_experience_link(url) else None
+
+
+async def load_report(url: str) -> Optional[Dict[str, Any]]:
+    exp_id = _stored_id(url)
+    if exp_id is None:
+        return None
+    try:
+        raw = await redis.get(REPORT_KEY.format(exp_id))
+    except RedisError as e:
+        logger.warning(f"Report lookup failed for {exp_id}: {e}")
+        return None
+    return json.loads(raw) if raw else None
+
+
+async def save_report(url: str, report: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Store a fully extracted report; returns it with its paragraph index.
+    Reports from non-Erowid URLs get the index but are not stored.
+    """
+    stored = {"url": url, **report, "paragraph_offsets": paragraph_offsets(report.get("content"))}
+    exp_id = _stored_id(url)
+    if exp_id is None:
+        return stored
+    try:
+        pipe = redis.pipeline(transaction=False)
+        pipe.set(REPORT_KEY.format(exp_id), json.dumps(stored))
+        pipe.zadd(REPORTS_KEY, {str(exp_id): time.time()})
+        await pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Failed to store report {exp_id}: {e}")
+    return stored
+
+
+def content_range(report: Dict[str, Any], offset: int, limit: Optional[int]) -> Dict[str, Any]:
+    """Report with content cut to paragraphs [offset, offset + limit)."""
+    offsets = report.get("paragraph_offsets", [])
+    offset = max(offset, 0)
+    end = len(offsets) if limit is None else min(offset + max(limit, 0), len(offsets))
+    content = report.get("content") or ""
+    page = offsets[offset:end]
+    return {
+        **report,
+        "content": content[page[0][0]:page[-1][1]] if page else "",
+        "paragraphs": {
+            "offset": offset,
+            "limit": limit,
+            "returned": len(page),
+            "total": len(offsets),
+            "has_more": end < len(offsets),
+        },
+    }
+
+
+def content_summary(report: Dict[str, Any]) -> Dict[str, Any]:
+    """Report without content: the first paragraph as an excerpt plus sizes."""
+    offsets = report.get("paragraph_offsets", [])
+    content = report.get("content") or ""
+    excerpt = content[offsets[0][0]:offsets[0][1]][:EXCERPT_CHARS] if offsets else None
+    summary = {k: v for k, v in report.items() if k != "content"}
+    return {
+        **summary,
+        "excerpt": excerpt,
+        "paragraphs": {"total": len(offsets), "characters": len(content)},
+    }
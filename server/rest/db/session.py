@@ -0,0 +1,13 @@
+from redis import asyncio as aioredis
+from core.config import settings
+
+# Shared connection pool to the Redis instance from docker-compose, used by the
+# response cache and the stores under db/. Blocking so bursts wait briefly for
+# a connection instead of opening unbounded ones.
+pool = aioredis.BlockingConnectionPool.from_url(
+    settings.REDIS_URL,
+    max_connections=settings.REDIS_MAX_CONNECTIONS,
+    timeout=settings.REDIS_POOL_TIMEOUT_SECONDS,
+    decode_responses=True,
+)
+redis = aioredis.Redis(connection_pool=pool)
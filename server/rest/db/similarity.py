@@ -0,0 +1,93 @@
+"""
+On-disk storage for the similarity index (api/utils/similarity.py).
+
+Each array is a plain .npy file under SIMILARITY_INDEX_PATH and is opened
+with mmap, so every worker process shares one copy through the page cache.
+A rebuild writes a sibling directory and swaps it in. Readers notice the
+new manifest's mtime on their next lookup and reopen the arrays in a thread,
+serving the previous index until that succeeds.
+"""
+import asyncio
+import json
+import os
+import shutil
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from api.utils.utils import logger
+from core.config import settings
+
+ARRAYS = ("exp_ids", "indptr", "indices", "data", "term_indptr", "term_rows", "term_data")
+
+
+class SimilarityIndex:
+    def __init__(self, path: str, manifest: Dict[str, Any]):
+        self.manifest = manifest
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta: List[Dict[str, Any]] = json.load(f)
+        self.size = len(self.exp_ids)
+        self._by_exp_id = np.argsort(self.exp_ids)
+
+    def row(self, exp_id: int) -> Optional[int]:
+        position = np.searchsorted(self.exp_ids, exp_id, sorter=self._by_exp_id)
+        if position < self.size and self.exp_ids[self._by_exp_id[position]] == exp_id:
+            return int(self._by_exp_id[position])
+        return None
+
+
+def save_index(arrays: Dict[str, np.ndarray], meta: List[Dict[str, Any]]) -> Dict[str, Any]:
+    path = settings.SIMILARITY_INDEX_PATH
+    partial, previous = f"{path}.partial", f"{path}.previous"
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+    for name in ARRAYS:
+        np.save(os.path.join(partial, f"{name}.npy"), arrays[name])
+    with open(os.path.join(partial, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    manifest = {"reports": len(meta), "terms": int(len(arrays["indices"])), "built_at": time.time()}
+    with open(os.path.join(partial, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, previous)
+    os.rename(partial, path)
+    shutil.rmtree(previous, ignore_errors=True)
+    return manifest
+
+
+def _open(path: str) -> SimilarityIndex:
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    return SimilarityIndex(path, manifest)
+
+
+_loaded: Optional[SimilarityIndex] = None
+_loaded_mtime: Optional[int] = None
+_reload = asyncio.Lock()
+
+
+async def current_index() -> Optional[SimilarityIndex]:
+    """The latest built index, reopened whenever a rebuild has replaced it."""
+    global _loaded, _loaded_mtime
+    path = settings.SIMILARITY_INDEX_PATH
+    try:
+        mtime = os.stat(os.path.join(path, "manifest.json")).st_mtime_ns
+    except OSError:
+        return _loaded
+    if mtime == _loaded_mtime:
+        return _loaded
+
+    async with _reload:
+        if mtime != _loaded_mtime:
+            try:
+                _loaded = await asyncio.to_thread(_open, path)
+                _loaded_mtime = mtime
+            except (OSError, ValueError) as e:
+                # Most likely a rebuild swapping directories mid-load: retry next lookup
+                logger.warning(f"Could not reopen the similarity index: {e}")
+    return _loaded
@@ -0,0 +1,143 @@
+"""
+Persistent resolution graph: substance info URL -> experiences URL -> categories.
+
+Both hops change very rarely on Erowid, so answers are kept in Redis with a
+long TTL. Entries older than GRAPH_REFRESH_AFTER_SECONDS are still served and
+refreshed in the background, keeping discovery off the request path.
+Negative answers (no experiences, no categories) only live for
+GRAPH_NEGATIVE_TTL_SECONDS.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from api.utils.utils import check_experience_exists, fetch_experience_categories, logger
+from core.cache import cache_backend
+from core.config import settings
+
+SUBSTANCE_KEY = "graph:substance:{}"
+CATEGORIES_KEY = "graph:categories:{}"
+REFRESHING_KEY = "graph:refreshing:{}"
+REFRESH_LOCK_SECONDS = 60
+
+_refreshing: Set[str] = set()
+_background: Set[asyncio.Task] = set()
+
+
+def _is_negative(value: Dict[str, Any]) -> bool:
+    return not value.get("experiences_url") and not value.get("categories")
+
+
+async def _write_many(values: Dict[str, Dict[str, Any]]) -> None:
+    now = time.time()
+    positive, negative = {}, {}
+    for key, value in values.items():
+        (negative if _is_negative(value) else positive)[key] = {**value, "refreshed_at": now}
+    await cache_backend.set_many(positive, settings.GRAPH_TTL_SECONDS)
+    await cache_backend.set_many(negative, settings.GRAPH_NEGATIVE_TTL_SECONDS)
+
+
+async def _write(key: str, value: Dict[str, Any]) -> None:
+    await _write_many({key: value})
+
+
+def _schedule_refresh(key: str, load: Callable[[], Awaitable[Dict[str, Any]]]) -> None:
+    if key in _refreshing:
+        return
+    _refreshing.add(key)
+
+    async def refresh():
+        try:
+            # One refresh per entry across all worker processes
+            if await cache_backend.add(REFRESHING_KEY.format(key), 1, REFRESH_LOCK_SECONDS):
+                await _write(key, await load())
+        except Exception as e:
+            logger.warning(f"Background graph refresh failed for {key}: {e}")
+        finally:
+            _refreshing.discard(key)
+
+    task = asyncio.create_task(refresh())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+def _check_fresh(key: str, entry: Dict[str, Any], load: Callable[[], Awaitable[Dict[str, Any]]]) -> None:
+    if time.time() - entry.get("refreshed_at", 0) > settings.GRAPH_REFRESH_AFTER_SECONDS:
+        _schedule_refresh(key, load)
+
+
+async def _resolve(
+    key: str,
+    load: Callable[[], Awaitable[Dict[str, Any]]],
+    before_load: Optional[Callable[[], Awaitable[None]]] = None,
+) -> Dict[str, Any]:
+    entry = await cache_backend.get(key)
+    if entry is None:
+        if before_load is not None:
+            await before_load()
+        entry = await load()
+        await _write(key, entry)
+        return entry
+    _check_fresh(key, entry, load)
+    return entry
+
+
+def _experiences_loader(url: str) -> Callable[[], Awaitable[Dict[str, Any]]]:
+    async def load():
+        has_experiences, more_url = await check_experience_exists(url)
+        return {"has_experiences": has_experiences, "experiences_url": more_url}
+    return load
+
+
+async def resolve_experiences(url: str) -> tuple[bool, str]:
+    """Graph-backed `check_experience_exists`."""
+    entry = await _resolve(SUBSTANCE_KEY.format(url), _experiences_loader(url))
+    return entry["has_experiences"], entry["experiences_url"]
+
+
+async def record_experiences(url: str, has_experiences: bool, experiences_url: str) -> None:
+    """Store a `check_experience_exists` answer read from a page fetched elsewhere."""
+    await _write(SUBSTANCE_KEY.format(url), {"has_experiences": has_experiences, "experiences_url": experiences_url})
+
+
+async def resolve_many_experiences(urls: List[str]) -> Dict[str, tuple[bool, str] | Exception]:
+    """
+    `resolve_experiences` for several substances with one multi-get.
+    Misses are looked up concurrently; a failed lookup maps to its exception.
+    """
+    keys = [SUBSTANCE_KEY.format(url) for url in urls]
+    entries = dict(zip(urls, await cache_backend.get_many(keys)))
+
+    missing = [url for url, entry in entries.items() if entry is None]
+    loaded = await asyncio.gather(*(_experiences_loader(url)() for url in missing), return_exceptions=True)
+    await _write_many({
+        SUBSTANCE_KEY.format(url): entry
+        for url, entry in zip(missing, loaded)
+        if not isinstance(entry, BaseException)
+    })
+    entries.update(zip(missing, loaded))
+
+    resolved: Dict[str, tuple[bool, str] | Exception] = {}
+    for url, entry in entries.items():
+        if isinstance(entry, BaseException):
+            resolved[url] = entry
+            continue
+        if url not in missing:
+            _check_fresh(SUBSTANCE_KEY.format(url), entry, _experiences_loader(url))
+        resolved[url] = (entry["has_experiences"], entry["experiences_url"])
+    return resolved
+
+
+async def resolve_categories(
+    experiences_url: str,
+    before_load: Optional[Callable[[], Awaitable[None]]] = None,
+) -> dict:
+    """
+    Graph-backed `fetch_experience_categories`. `before_load` is awaited only
+    when the answer has to be fetched from Erowid.
+    """
+    async def load():
+        return {"categories": await fetch_experience_categories(experiences_url)}
+
+    entry = await _resolve(CATEGORIES_KEY.format(experiences_url), load, before_load)
+    return entry["categories"]
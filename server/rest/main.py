@@ -1,15 +1,44 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import Response
-from prometheus_client import make_asgi_app, Counter, Histogram
+from prometheus_client import make_asgi_app, multiprocess, CollectorRegistry, Counter, Histogram
 import time
 from core.config import settings
-from api.routes.v1.erowid import substances, experiences, information
+from api.routes.v1.erowid import substances, experiences, information, export, analytics
+from api.utils.analytics import rebuild as rebuild_analytics
+from api.utils.similarity import build_index as build_similarity_index
 from api.routes.v1 import base
-from cache_fastapi.cacheMiddleware import CacheMiddleware
-from cache_fastapi.Backends.redis_backend import RedisBackend
+from core.cache import ResponseCacheMiddleware, cache_backend
+from core.admission import AdmissionControlMiddleware
+from core.jobs import run_periodically
 
-app = FastAPI(title=settings.PROJECT_NAME)
+# Set by `python cli.py serve` when running several uvicorn workers
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    jobs = []
+    if settings.ANALYTICS_REFRESH_SECONDS > 0:
+        jobs.append(asyncio.create_task(
+            run_periodically("analytics", settings.ANALYTICS_REFRESH_SECONDS, rebuild_analytics)
+        ))
+    if settings.SIMILARITY_REFRESH_SECONDS > 0:
+        jobs.append(asyncio.create_task(
+            # The index lives on local disk, so every replica builds its own
+            run_periodically("similarity", settings.SIMILARITY_REFRESH_SECONDS, build_similarity_index, per_host=True)
+        ))
+    yield
+    for job in jobs:
+        job.cancel()
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan)
 
 # Prometheus metrics
 request_count = Counter(
@@ -47,17 +76,25 @@ async def prometheus_middleware(request, call_next):
     
     return response
 
+# Added before the cache so it runs inside it: cache hits never reach it
 app.add_middleware(
-    CacheMiddleware,
-    backend=RedisBackend(),
-    cached_endpoints=[
-        f"{settings.API_V1_STR}/erowid/experiences/categories",
-        f"{settings.API_V1_STR}/erowid/experience",
-        f"{settings.API_V1_STR}/erowid/user",
-        f"{settings.API_V1_STR}/erowid/substances",
-        # f"{settings.API_V1_STR}/erowid/category/experiences",
-        f"{settings.API_V1_STR}/erowid/information",
+    AdmissionControlMiddleware,
+    guarded_prefix=f"{settings.API_V1_STR}/erowid",
+    exempt_prefixes=[
+        f"{settings.API_V1_STR}/erowid/export",
+        f"{settings.API_V1_STR}/erowid/analytics",
+        f"{settings.API_V1_STR}/erowid/experience/similar",
     ],
+    max_inflight=max(settings.ADMISSION_MAX_INFLIGHT // settings.WORKERS, 1),
+    max_queue=settings.ADMISSION_MAX_QUEUE // settings.WORKERS,
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    retry_after=settings.ADMISSION_RETRY_AFTER_SECONDS,
+)
+
+app.add_middleware(
+    ResponseCacheMiddleware,
+    backend=cache_backend,
+    ttls={f"{settings.API_V1_STR}{path}": ttl for path, ttl in settings.CACHE_TTLS.items()},
 )
 
 app.add_middleware(
@@ -72,7 +109,14 @@ app.include_router(base.router, prefix=settings.API_V1_STR)
 app.include_router(substances.router, prefix=settings.API_V1_STR)
 app.include_router(experiences.router, prefix=settings.API_V1_STR)
 app.include_router(information.router, prefix=settings.API_V1_STR)
+app.include_router(export.router, prefix=settings.API_V1_STR)
+app.include_router(analytics.router, prefix=settings.API_V1_STR)
 
-# Mount Prometheus metrics endpoint
-metrics_app = make_asgi_app()
+# Mount Prometheus metrics endpoint, summed over all workers in multi-worker mode
+if MULTIPROCESS:
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    metrics_app = make_asgi_app(registry=registry)
+else:
+    metrics_app = make_asgi_app()
 app.mount("/metrics", metrics_app)
\ No newline at end of file
@@ -0,0 +1,40 @@
+import os
+from pathlib import Path
+
+import pytest
+
+# Settings require a Redis URL at import time; tests never connect to it
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+import fakeredis  # noqa: E402  (requirements-test.txt)
+
+from db import session  # noqa: E402
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def page():
+    """Read a saved page from tests/fixtures."""
+    def read(name: str) -> str:
+        return (FIXTURES / name).read_text(encoding="cp1252")
+    return read
+
+
+@pytest.fixture
+def redis():
+    """
+    The shared client from db.session, pointed at an empty in-memory server.
+    Every store and registered Lua script goes through that client, so
+    swapping its pool is enough.
+    """
+    fake = fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    pool = session.redis.connection_pool
+    session.redis.connection_pool = fake.connection_pool
+    yield session.redis
+    session.redis.connection_pool = pool
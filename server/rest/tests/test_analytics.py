@@ -0,0 +1,65 @@
+import math
+
+import numpy as np
+import pytest
+
+from api.utils.analytics import QUANTILES, UNKNOWN, grouped_quantiles, normalize_amount
+
+
+@pytest.mark.parametrize("amount, expected", [
+    ("100 ug", (0.1, "mg")),
+    ("150 µg", (0.15, "mg")),
+    ("2.5 g", (2500.0, "mg")),
+    ("about 200mg", (200.0, "mg")),
+    ("5-10 ml", (7.5, "mL")),
+    ("1/2 tab", (0.5, "tab")),
+    ("2 tabs", (2.0, "tab")),
+    ("1 hit", (1.0, "hit")),
+    ("2 glasses", (2.0, "glass")),
+    ("3 beers", (3.0, "drink")),
+    ("1 capsule", (1.0, "capsule")),
+    ("2 caps", (2.0, "capsule")),
+    ("3 x 100 mg", (300.0, "mg")),
+    ("2x 1.5 g", (3000.0, "mg")),
+    ("4 × 2 tabs", (8.0, "tab")),
+])
+def test_normalize_amount(amount, expected):
+    value, unit = normalize_amount(amount)
+    assert unit == expected[1]
+    assert value == pytest.approx(expected[0])
+
+
+@pytest.mark.parametrize("amount", [None, "", "repeated", "3 mushrooms", "12"])
+def test_normalize_amount_unknown(amount):
+    value, unit = normalize_amount(amount)
+    assert math.isnan(value)
+    assert unit == UNKNOWN
+
+
+def test_grouped_quantiles_matches_numpy():
+    rng = np.random.default_rng(7)
+    keys = rng.integers(0, 6, 500)
+    values = rng.lognormal(3, 1, 500)
+    values[rng.random(500) < 0.1] = np.nan
+
+    groups, counts, means, lows, highs, quantiles = grouped_quantiles(keys, values)
+
+    for i, group in enumerate(groups):
+        expected = values[(keys == group) & ~np.isnan(values)]
+        assert counts[i] == len(expected)
+        assert means[i] == pytest.approx(expected.mean())
+        assert lows[i] == expected.min()
+        assert highs[i] == expected.max()
+        np.testing.assert_allclose(quantiles[i], np.percentile(expected, np.array(QUANTILES) * 100))
+
+
+def test_grouped_quantiles_single_value_and_empty():
+    groups, counts, means, lows, highs, quantiles = grouped_quantiles(
+        np.array([4, 9, 9]), np.array([2.0, np.nan, np.nan]), (0.5,)
+    )
+    assert groups.tolist() == [4]
+    assert counts.tolist() == [1]
+    assert quantiles.tolist() == [[2.0]]
+
+    groups, counts, means, lows, highs, quantiles = grouped_quantiles(np.array([1]), np.array([np.nan]))
+    assert len(groups) == 0 and quantiles.shape == (0, len(QUANTILES))
@@ -0,0 +1,123 @@
+import time
+import types
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+
+from core import cache
+from core.cache import ResponseCacheMiddleware, cache_backend
+from core.config import settings
+
+pytestmark = pytest.mark.anyio
+
+TTL = 60
+
+
+class Upstream:
+    """Route behaviour the tests switch between requests."""
+
+    def __init__(self):
+        self.calls = 0
+        self.mode = "ok"
+
+    def __call__(self, item: str):
+        self.calls += 1
+        if self.mode == "down":
+            raise HTTPException(status_code=502, detail="Erowid returned 503")
+        if self.mode == "crash":
+            raise RuntimeError("handler bug")
+        if item == "missing":
+            raise HTTPException(status_code=404, detail="Experience not found")
+        return {"item": item, "version": self.calls}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Wall clock seen by the cache middleware, advanced by hand."""
+    now = [time.time()]
+    monkeypatch.setattr(cache, "time", types.SimpleNamespace(time=lambda: now[0], perf_counter=time.perf_counter))
+    return now
+
+
+@pytest.fixture
+def upstream():
+    return Upstream()
+
+
+@pytest.fixture
+async def client(redis, upstream):
+    app = FastAPI()
+    app.get("/items/{item}")(upstream)
+    app.add_middleware(ResponseCacheMiddleware, backend=cache_backend, ttls={"/items": TTL})
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+async def test_hit_after_miss(client, upstream, clock):
+    first = await client.get("/items/a")
+    second = await client.get("/items/a")
+
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.json() == first.json()
+    assert upstream.calls == 1
+
+
+async def test_no_cache_bypasses(client, upstream, clock):
+    await client.get("/items/a")
+    response = await client.get("/items/a", headers={"Cache-Control": "no-cache"})
+    assert "X-Cache" not in response.headers
+    assert upstream.calls == 2
+
+
+@pytest.mark.parametrize("mode", ["down", "crash"])
+async def test_stale_if_error(client, upstream, clock, mode):
+    fresh = await client.get("/items/a")
+    clock[0] += TTL + 1
+    upstream.mode = mode
+
+    response = await client.get("/items/a")
+
+    assert response.status_code == 200
+    assert response.headers["X-Cache"] == "STALE"
+    assert response.headers["Warning"] == '110 - "Response is Stale"'
+    assert response.json() == fresh.json()
+
+
+async def test_errors_without_stale_copy_are_not_cached(client, upstream, clock):
+    upstream.mode = "down"
+    response = await client.get("/items/a")
+    assert response.status_code == 502
+    assert response.headers["X-Cache"] == "MISS"
+
+    upstream.mode = "ok"
+    response = await client.get("/items/a")
+    assert response.status_code == 200
+    assert response.headers["X-Cache"] == "MISS"
+    assert upstream.calls == 2
+
+
+async def test_negative_cache(client, upstream, clock):
+    first = await client.get("/items/missing")
+    second = await client.get("/items/missing")
+
+    assert (first.status_code, first.headers["X-Cache"]) == (404, "MISS")
+    assert (second.status_code, second.headers["X-Cache"]) == (404, "NEGATIVE")
+    assert second.json() == first.json()
+    assert upstream.calls == 1
+
+    clock[0] += settings.NEGATIVE_CACHE_TTL_SECONDS + 1
+    third = await client.get("/items/missing")
+    assert third.headers["X-Cache"] == "MISS"
+    assert upstream.calls == 2
+
+
+async def test_negative_entries_are_never_served_stale(client, upstream, clock):
+    await client.get("/items/missing")
+    clock[0] += settings.NEGATIVE_CACHE_TTL_SECONDS + 1
+    upstream.mode = "down"
+
+    response = await client.get("/items/missing")
+    assert response.status_code == 502
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from core.config import settings
+from db import crawl_queue
+from db.crawl_queue import CrawlTask
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_enqueue_once_per_crawl(redis):
+    task = CrawlTask("report", "https://www.erowid.org/experiences/exp.php?ID=1")
+    assert await crawl_queue.enqueue([task, CrawlTask("listing", task.url, 100)]) == 2
+    assert await crawl_queue.enqueue([task]) == 0
+    assert (await crawl_queue.status())["queued"] == 2
+
+
+async def test_claim_leases_ready_tasks_in_order(redis):
+    first, later = CrawlTask("report", "https://a"), CrawlTask("report", "https://b")
+    await crawl_queue.enqueue([first])
+    await crawl_queue.enqueue([later], delay=60)
+
+    claimed = await crawl_queue.claim()
+    assert claimed == CrawlTask("report", "https://a", attempts=1)
+    assert await crawl_queue.claim() is None  # the other task is not ready yet
+
+    state = await crawl_queue.status()
+    assert (state["queued"], state["leased"]) == (1, 1)
+
+
+async def test_expired_lease_is_claimed_again(redis, monkeypatch):
+    await crawl_queue.enqueue([CrawlTask("listing", "https://a")])
+    monkeypatch.setattr(settings, "CRAWL_LEASE_SECONDS", -1)
+
+    assert (await crawl_queue.claim()).attempts == 1
+    # The worker holding it went away: the next claim takes it back
+    assert (await crawl_queue.claim()).attempts == 2
+
+
+async def test_complete(redis):
+    await crawl_queue.enqueue([CrawlTask("report", "https://a")])
+    task = await crawl_queue.claim()
+    await crawl_queue.complete(task)
+
+    state = await crawl_queue.status()
+    assert (state["queued"], state["leased"], state["seen"]) == (0, 0, 1)
+    assert state["stats"] == {"report:done": 1}
+    assert await crawl_queue.enqueue([task]) == 0
+
+
+async def test_claim_drops_tasks_completed_under_an_expired_lease(redis, monkeypatch):
+    stale, fresh = CrawlTask("report", "https://a"), CrawlTask("report", "https://b")
+    await crawl_queue.enqueue([stale])
+    await crawl_queue.enqueue([fresh], delay=0.001)
+    monkeypatch.setattr(settings, "CRAWL_LEASE_SECONDS", -1)
+
+    task = await crawl_queue.claim()
+    await crawl_queue.complete(task)  # too late: the lease had expired and was requeued
+    await redis.zadd(crawl_queue.QUEUE_KEY, {stale.id: 0})
+
+    assert await crawl_queue.claim() == CrawlTask("report", "https://b", attempts=1)
+    assert not await redis.hexists(crawl_queue.ATTEMPTS_KEY, stale.id)
+
+
+async def test_fail_backs_off_then_parks_dead(redis, monkeypatch):
+    monkeypatch.setattr(settings, "CRAWL_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(settings, "CRAWL_RETRY_BASE_SECONDS", 30)
+    await crawl_queue.enqueue([CrawlTask("report", "https://a")])
+
+    task = await crawl_queue.claim()
+    assert await crawl_queue.fail(task, "boom")
+    ready_at = await redis.zscore(crawl_queue.QUEUE_KEY, task.id)
+    assert ready_at == pytest.approx(time.time() + 30, abs=5)
+    assert await crawl_queue.claim() is None
+
+    await redis.zadd(crawl_queue.QUEUE_KEY, {task.id: 0})
+    task = await crawl_queue.claim()
+    assert task.attempts == 2
+    assert not await crawl_queue.fail(task, "boom again")
+
+    state = await crawl_queue.status()
+    assert (state["queued"], state["leased"], state["dead"]) == (0, 0, 1)
+    assert state["stats"] == {"report:dead": 1, "report:retried": 1}
+
+    assert await crawl_queue.requeue_dead() == 1
+    assert (await crawl_queue.claim()).attempts == 1
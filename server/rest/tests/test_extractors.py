@@ -0,0 +1,181 @@
+"""
+Parity of the parse-only specs in api/utils/extractors.py with the full-tree
+scraping they replaced, on saved Erowid pages.
+"""
+import re
+
+from bs4 import BeautifulSoup, Tag
+
+from api.utils.extractors import extract_report, listing_rows, parse_listing, parse_listing_row, report_paragraphs
+
+
+def baseline_report(html: str) -> dict:
+    """The report scraper from before the extraction specs, verbatim."""
+    soup = BeautifulSoup(html, "html.parser")
+
+    title = (soup.find("div", class_="title") or Tag()).get_text(strip=True) or None
+    author = (
+        soup.find("div", class_="author").find("a").get_text(strip=True)
+        if soup.find("div", class_="author") and soup.find("div", class_="author").find("a")
+        else None
+    )
+    substances = (
+        soup.find("div", class_="substance").get_text(strip=True)
+        if soup.find("div", class_="substance")
+        else None
+    )
+
+    doses = []
+    dosechart = soup.find("table", class_="dosechart")
+    if dosechart:
+        for row in dosechart.find_all("tr"):
+            amount_cell = row.find("td", class_="dosechart-amount")
+            method_cell = row.find("td", class_="dosechart-method")
+            substance_cell = row.find("td", class_="dosechart-substance")
+            form_cell = row.find("td", class_="dosechart-form")
+
+            dose = {
+                "amount": amount_cell.get_text(strip=True) if amount_cell else None,
+                "method": method_cell.get_text(strip=True) if method_cell else None,
+                "substance": substance_cell.get_text(strip=True) if substance_cell else None,
+                "form": form_cell.get_text(strip=True) if form_cell else None,
+            }
+
+            if any(dose.values()):
+                doses.append(dose)
+    metadata = {}
+    footdata = soup.find("table", class_="footdata")
+    if footdata:
+        for cell in footdata.find_all("td"):
+            txt = cell.get_text(strip=True)
+            if txt.startswith("Gender:"):
+                metadata["gender"] = txt.replace("Gender:", "").strip()
+            elif txt.startswith("Age"):
+                metadata["age"] = txt.replace("Age at time of experience:", "").strip()
+            elif txt.startswith("Published:"):
+                metadata["published"] = txt.replace("Published:", "").strip()
+            elif txt.startswith("Views:"):
+                metadata["views"] = txt.replace("Views:", "").strip()
+            elif txt.startswith("ExpID:"):
+                metadata["exp_id"] = txt.replace("ExpID:", "").strip()
+            elif "topic-list" in cell.get("class", []):
+                metadata["topics"] = txt
+
+    content_div = soup.find("div", class_="report-text-surround")
+    cleaned_text = None
+
+    if content_div:
+        for tbl in content_div.find_all("table"):
+            tbl.decompose()
+
+        for br in content_div.find_all("br"):
+            br.replace_with("\n")
+
+        raw_text = content_div.get_text(separator="\n", strip=True)
+
+        cleaned_text = re.sub(r"\n{2,}", "\n\n", raw_text)
+
+    return {
+        "title": title,
+        "author": author,
+        "substance": substances,
+        "doses": doses,
+        "content": cleaned_text,
+        "metadata": metadata,
+    }
+
+
+def baseline_listing(html: str) -> list:
+    """The listing row scraper from before the extraction specs, verbatim."""
+    soup = BeautifulSoup(html, "html.parser")
+    table = soup.find("table", class_="exp-list-table")
+    exps = []
+    for r in table.select('tr[class^="exp-list-row"]'):
+        a_tag = r.select_one("td.exp-title a")
+        if not a_tag:
+            continue
+        raw_href = a_tag["href"].lstrip("/")
+        full_url = (
+            f"https://www.erowid.org/{raw_href}"
+            if raw_href.startswith("experiences/")
+            else f"https://www.erowid.org/experiences/{raw_href}"
+        )
+        author_tag = r.select_one("td.exp-author")
+        substance_tag = r.select_one("td.exp-substance")
+        rating_tag = r.select_one("img[alt]")
+        date_tag = r.select_one("td.exp-pubdate")
+
+        exps.append(
+            {
+                "title": a_tag.text.strip(),
+                "url": full_url,
+                "author": author_tag.text.strip() if author_tag else None,
+                "substance": substance_tag.text.strip() if substance_tag else None,
+                "rating": rating_tag["alt"] if rating_tag else "Unrated",
+                "date": date_tag.text.strip() if date_tag else None,
+            }
+        )
+    return exps
+
+
+def spec_listing(html: str, fields=None) -> list:
+    table = parse_listing(html).find("table", class_="exp-list-table")
+    return [row for row in (parse_listing_row(r, fields) for r in listing_rows(table)) if row]
+
+
+def test_report_fields_match_baseline(page):
+    html = page("report.html")
+    expected = baseline_report(html)
+    report = extract_report(html)
+
+    for name in ("title", "author", "substance", "doses", "metadata"):
+        assert report[name] == expected[name], name
+    assert report["doses"] and report["metadata"]["exp_id"] == "12345"
+
+
+def test_report_content_keeps_baseline_words(page):
+    # Paragraph breaks changed on purpose (see test_report_paragraphs); the
+    # text itself must not
+    html = page("report.html")
+    words = "".join(baseline_report(html)["content"].split())
+    assert "".join(extract_report(html)["content"].split()) == words
+
+
+def test_report_field_selection(page):
+    html = page("report.html")
+    full = extract_report(html)
+    assert extract_report(html, ["title", "doses"]) == {"title": full["title"], "doses": full["doses"]}
+
+
+def test_report_paragraphs(page):
+    html = page("report.html")
+    content_div = BeautifulSoup(html, "html.parser").find("div", class_="report-text-surround")
+
+    assert report_paragraphs(content_div) == [
+        "We drove up to the ridge the night before, planning to watch the sun come up. "
+        "I had tested the blotter with Ehrlich reagent, and it turned purple as expected.",
+        "At T+0:45 the first alerts arrived: a lightness in the chest,\n"
+        "colours getting louder, and a lot of laughing at nothing.",
+        "The peak was gentle. We sat on a rock and watched the valley fill with light.",
+        "Later, back at camp, I smoked a small bowl, which brought back some of the visuals.",
+        "Overall a lovely, manageable experience – I would do it again.",
+        "Final thought: set & setting matter.",
+    ]
+    assert extract_report(html)["content"] == "\n\n".join(report_paragraphs(content_div))
+
+
+def test_listing_rows_match_baseline(page):
+    html = page("listing.html")
+    rows = spec_listing(html)
+    assert rows == baseline_listing(html)
+    assert [row["url"] for row in rows] == [
+        "https://www.erowid.org/experiences/exp.php?ID=12345",
+        "https://www.erowid.org/experiences/exp.php?ID=23456",
+        "https://www.erowid.org/experiences/exp.php?ID=34567",
+    ]
+
+
+def test_listing_field_selection(page):
+    html = page("listing.html")
+    expected = [{"url": row["url"], "date": row["date"]} for row in baseline_listing(html)]
+    assert spec_listing(html, ["url", "date"]) == expected
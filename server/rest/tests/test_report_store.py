@@ -0,0 +1,84 @@
+import pytest
+
+from db.report_store import (
+    REPORTS_KEY,
+    content_range,
+    content_summary,
+    load_report,
+    paragraph_offsets,
+    save_report,
+)
+
+URL = "https://www.erowid.org/experiences/exp.php?ID=12345"
+
+REPORT = {
+    "title": "Sunrise on the Ridge",
+    "content": "First paragraph.\nStill the first.\n\nSecond.\n\nThird and last.",
+}
+
+
+@pytest.mark.anyio
+async def test_save_and_load(redis):
+    stored = await save_report(URL, REPORT)
+    assert await load_report(URL) == stored
+    assert await redis.zscore(REPORTS_KEY, "12345") is not None
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("url", [
+    "https://attacker.example/page?ID=12345",
+    "http://www.erowid.org/experiences/exp.php?ID=12345",
+    "https://www.erowid.org.attacker.example/experiences/exp.php?ID=12345",
+    "https://www.erowid.org/experiences/exp.php?ID=12345&x=1",
+])
+async def test_foreign_urls_never_touch_the_store(redis, url):
+    stored = await save_report(url, {**REPORT, "title": "Injected"})
+    assert stored["title"] == "Injected"
+    assert stored["paragraph_offsets"]  # still usable for ranges
+    assert await redis.zcard(REPORTS_KEY) == 0
+
+    await save_report(URL, REPORT)
+    assert await load_report(url) is None
+    assert (await load_report(URL))["title"] == REPORT["title"]
+
+
+def stored():
+    return {**REPORT, "paragraph_offsets": paragraph_offsets(REPORT["content"])}
+
+
+def test_paragraph_offsets():
+    content = REPORT["content"]
+    assert [content[start:end] for start, end in paragraph_offsets(content)] == [
+        "First paragraph.\nStill the first.", "Second.", "Third and last.",
+    ]
+    assert paragraph_offsets(None) == paragraph_offsets("") == []
+
+
+@pytest.mark.parametrize("offset, limit, content, returned, has_more", [
+    (0, None, REPORT["content"], 3, False),
+    (1, 1, "Second.", 1, True),
+    (1, None, "Second.\n\nThird and last.", 2, False),
+    (-5, 1, "First paragraph.\nStill the first.", 1, True),
+    (0, 0, "", 0, True),
+    (2, 10, "Third and last.", 1, False),
+    (3, 1, "", 0, False),
+    (99, None, "", 0, False),
+])
+def test_content_range(offset, limit, content, returned, has_more):
+    page = content_range(stored(), offset, limit)
+    assert page["content"] == content
+    assert page["paragraphs"]["returned"] == returned
+    assert page["paragraphs"]["has_more"] is has_more
+    assert page["paragraphs"]["total"] == 3
+    assert page["paragraphs"]["offset"] == max(offset, 0)
+
+
+def test_content_summary():
+    summary = content_summary(stored())
+    assert "content" not in summary
+    assert summary["excerpt"] == "First paragraph.\nStill the first."
+    assert summary["paragraphs"] == {"total": 3, "characters": len(REPORT["content"])}
+
+    empty = content_summary({"title": "t", "content": None, "paragraph_offsets": []})
+    assert empty["excerpt"] is None
+    assert empty["paragraphs"] == {"total": 0, "characters": 0}
@@ -0,0 +1,146 @@
+import os
+import types
+
+import numpy as np
+import pytest
+
+from api.utils import similarity
+from api.utils.similarity import HASH_BITS, invert, most_similar, weigh
+from core.config import settings
+from db import similarity as store
+
+N_ROWS = 80
+
+
+def corpus(seed=3):
+    """Random (row, term, count) triples sorted by row, unique terms per row, distinct counts."""
+    rng = np.random.default_rng(seed)
+    vocabulary = rng.choice(1 << HASH_BITS, 300, replace=False)
+    rows, terms = [], []
+    for row in range(N_ROWS):
+        picked = rng.choice(vocabulary, rng.integers(3, 70), replace=False)
+        rows += [row] * len(picked)
+        terms += picked.tolist()
+    counts = 1 + rng.random(len(rows)) * 9
+    return np.array(rows, np.int32), np.array(terms, np.int32), counts.astype(np.float32)
+
+
+def dense_tfidf(rows, terms, counts, max_df):
+    """Unpruned, L2-normalized weights as {row: {term: weight}}, computed the slow way."""
+    df = {}
+    for term in terms.tolist():
+        df[term] = df.get(term, 0) + 1
+    vectors = {row: {} for row in range(N_ROWS)}
+    for row, term, count in zip(rows.tolist(), terms.tolist(), counts.tolist()):
+        if df[term] <= max(max_df * N_ROWS, 1):
+            idf = np.log((1 + N_ROWS) / (1 + df[term])) + 1
+            vectors[row][term] = (1 + np.log(count)) * idf
+    for vector in vectors.values():
+        norm = np.sqrt(sum(w * w for w in vector.values()))
+        for term in vector:
+            vector[term] /= norm
+    return vectors
+
+
+def csr_rows(indptr, indices, data):
+    return {
+        row: dict(zip(indices[indptr[row]:indptr[row + 1]].tolist(), data[indptr[row]:indptr[row + 1]].tolist()))
+        for row in range(len(indptr) - 1)
+    }
+
+
+def test_weigh_matches_dense_tfidf():
+    rows, terms, counts = corpus()
+    indptr, indices, data = weigh(rows, terms, counts, N_ROWS, max_df=0.2, terms_per_row=1000)
+    expected = dense_tfidf(rows, terms, counts, max_df=0.2)
+
+    for row, vector in csr_rows(indptr, indices, data).items():
+        assert vector.keys() == expected[row].keys()
+        for term, weight in vector.items():
+            assert weight == pytest.approx(expected[row][term], rel=1e-5)
+
+
+def test_weigh_keeps_each_rows_heaviest_terms():
+    rows, terms, counts = corpus()
+    indptr, indices, data = weigh(rows, terms, counts, N_ROWS, max_df=1.0, terms_per_row=10)
+    expected = dense_tfidf(rows, terms, counts, max_df=1.0)
+
+    for row, vector in csr_rows(indptr, indices, data).items():
+        heaviest = sorted(expected[row], key=expected[row].get, reverse=True)[:10]
+        assert sorted(vector) == sorted(heaviest)
+        assert sum(w * w for w in vector.values()) == pytest.approx(1, rel=1e-5)
+
+
+@pytest.mark.parametrize("query_terms", [8, 1000])
+def test_most_similar_matches_brute_force_cosine(monkeypatch, query_terms):
+    monkeypatch.setattr(similarity, "QUERY_TERMS", query_terms)
+    rows, terms, counts = corpus()
+    indptr, indices, data = weigh(rows, terms, counts, N_ROWS, max_df=0.5, terms_per_row=40)
+    term_indptr, term_rows, term_data = invert(indptr, indices, data)
+    index = types.SimpleNamespace(
+        indptr=indptr, indices=indices, data=data, size=N_ROWS,
+        term_indptr=term_indptr, term_rows=term_rows, term_data=term_data,
+    )
+    vectors = csr_rows(indptr, indices, data)
+
+    for row in range(0, N_ROWS, 7):
+        query = dict(sorted(vectors[row].items(), key=lambda item: item[1], reverse=True)[:query_terms])
+        scores = np.array([
+            0.0 if other == row else sum(w * vectors[other].get(t, 0.0) for t, w in query.items())
+            for other in range(N_ROWS)
+        ])
+        k = 5
+        found = most_similar(index, row, k)
+
+        expected = np.sort(scores[scores > 0])[::-1][:k]
+        np.testing.assert_allclose([score for _, score in found], expected, rtol=1e-5)
+        for other, score in found:
+            assert score == pytest.approx(scores[other], rel=1e-5)
+            assert other != row
+
+
+def save(meta_ids):
+    exp_ids = np.array(meta_ids, np.int64)
+    indptr = np.zeros(len(exp_ids) + 1, np.int64)
+    empty = np.empty(0, np.int32)
+    return store.save_index({
+        "exp_ids": exp_ids, "indptr": indptr, "indices": empty, "data": np.empty(0, np.float32),
+        "term_indptr": np.zeros(2, np.int64), "term_rows": empty, "term_data": np.empty(0, np.float32),
+    }, [{"url": f"u{i}"} for i in meta_ids])
+
+
+@pytest.fixture
+def index_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "similarity")
+    monkeypatch.setattr(settings, "SIMILARITY_INDEX_PATH", path)
+    monkeypatch.setattr(store, "_loaded", None)
+    monkeypatch.setattr(store, "_loaded_mtime", None)
+    return path
+
+
+@pytest.mark.anyio
+async def test_current_index_reopens_after_rebuild(index_path):
+    assert await store.current_index() is None
+
+    save([30, 10, 20])
+    first = await store.current_index()
+    assert first.row(10) == 1 and first.row(99) is None
+    assert await store.current_index() is first
+
+    save([40])
+    manifest = os.path.join(index_path, "manifest.json")
+    os.utime(manifest, ns=(0, os.stat(manifest).st_mtime_ns + 1))
+    second = await store.current_index()
+    assert second is not first and second.row(40) == 0
+
+
+@pytest.mark.anyio
+async def test_current_index_keeps_serving_through_a_broken_swap(index_path):
+    save([10])
+    first = await store.current_index()
+
+    save([20])
+    os.remove(os.path.join(index_path, "term_data.npy"))  # as if swapped out mid-load
+    manifest = os.path.join(index_path, "manifest.json")
+    os.utime(manifest, ns=(0, os.stat(manifest).st_mtime_ns + 1))
+    assert await store.current_index() is first